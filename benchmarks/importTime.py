@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+#    importTime.py - keep an eye on how long mikeplotlib takes to import      #
+#                                                                             #
+#    python benchmarks/importTime.py [--repeats 5] [--max-seconds 0.5]       #
+#                                                                             #
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = "Michael Imelfort"
+__copyright__ = "Copyright 2014"
+__credits__ = ["Michael Imelfort"]
+__license__ = "GPL3"
+__version__ = "1.0.0"
+__maintainer__ = "Michael Imelfort"
+__email__ = "mike@mikeimelfort.com"
+__status__ = "Released"
+
+###############################################################################
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+# modules that should never be loaded just by importing these
+HEAVY_MODULES = ["numpy", "matplotlib", "scipy", "pkg_resources", "pandas"]
+
+# heavy modules that a module really does need at import time
+ALLOWED = {"mikeplotlib.cbCols" : ["numpy"],
+           "mikeplotlib.stackedBarGraph" : ["numpy"],
+           "mikeplotlib.heatMap" : ["numpy"]}
+
+IMPORTS = ["mikeplotlib",
+           "mikeplotlib.sineBow",
+           "mikeplotlib.cbCols",
+           "mikeplotlib.stackedBarGraph",
+           "mikeplotlib.heatMap"]
+
+# run in a fresh interpreter so nothing is cached between measurements
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import %s
+elapsed = time.perf_counter() - start
+heavy = sorted(set(m.split(".")[0] for m in sys.modules) & set(%r))
+print(json.dumps({"seconds": elapsed, "heavy": heavy}))
+'''
+
+def timeImport(module, repeats):
+    '''time importing a module in fresh interpreters
+
+    Inputs:
+     module - string, dotted module name
+     repeats - int, number of interpreters to start
+
+    Outputs:
+     (best_seconds, [heavy modules that were loaded])
+    '''
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([package_root, env.get("PYTHONPATH", "")])
+    best = None
+    heavy = []
+    for i in range(repeats):
+        out = subprocess.check_output([sys.executable, "-c", PROBE % (module, HEAVY_MODULES)],
+                                      env=env)
+        result = json.loads(out.decode().strip().splitlines()[-1])
+        if best is None or result["seconds"] < best:
+            best = result["seconds"]
+        heavy = result["heavy"]
+    return (best, heavy)
+
+def main():
+    parser = argparse.ArgumentParser(description="time importing mikeplotlib modules")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="fresh interpreters per module (best time is kept)")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="fail if any import takes longer than this")
+    args = parser.parse_args()
+
+    failed = False
+    for module in IMPORTS:
+        (seconds, heavy) = timeImport(module, args.repeats)
+        heavy = [m for m in heavy if m not in ALLOWED.get(module, [])]
+        status = "ok"
+        if len(heavy) > 0:
+            status = "FAIL loads %s" % ", ".join(heavy)
+            failed = True
+        elif args.max_seconds is not None and seconds > args.max_seconds:
+            status = "FAIL slower than %0.3fs" % args.max_seconds
+            failed = True
+        print("%-32s %8.1f ms  %s" % (module, seconds * 1000., status))
+    return 1 if failed else 0
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+#    plotBench.py - time and memory benchmarks for every plotting path        #
+#                                                                             #
+#    python benchmarks/plotBench.py --save benchmarks/baseline.json           #
+#    python benchmarks/plotBench.py --compare benchmarks/baseline.json        #
+#                                                                             #
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = "Michael Imelfort"
+__copyright__ = "Copyright 2014"
+__credits__ = ["Michael Imelfort"]
+__license__ = "GPL3"
+__version__ = "1.0.0"
+__maintainer__ = "Michael Imelfort"
+__email__ = "mike@mikeimelfort.com"
+__status__ = "Released"
+
+###############################################################################
+
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+SCALES = [100, 10000, 1000000]
+
+# every dataset comes from this seed so runs are comparable
+SEED = 42
+
+def makeMatrix(cells, columns=None):
+    '''synthetic data with roughly the requested number of cells
+
+    Inputs:
+     cells - int, number of cells wanted
+     columns - int, number of columns (default about sqrt(cells))
+
+    Outputs:
+     float matrix (rows x columns)
+    '''
+    if columns is None:
+        columns = max(2, int(round(np.sqrt(cells))))
+    rows = max(2, cells // columns)
+    rs = np.random.RandomState(SEED)
+    # a few blocks of similar rows so clustering has something to find
+    centres = rs.rand(5, columns)
+    return centres[rs.randint(0, 5, rows)] + rs.rand(rows, columns) * 0.2
+
+def _names(n, prefix):
+    return ["%s%d" % (prefix, i) for i in range(n)]
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+def benchMakeColor(cells):
+    from mikeplotlib.sineBow import SineBow
+    SB = SineBow(1., lowerBound=0., mapType="rb")
+    values = np.random.RandomState(SEED).rand(cells).tolist()
+    def run():
+        for value in values:
+            SB.makeColor(value, hexFormat=True)
+    return run
+
+def _benchMakeMap(cells, ordered):
+    from mikeplotlib.heatMap import HeatMap
+    data = makeMatrix(cells)
+    (rows, cols) = data.shape
+    HM = HeatMap(data, _names(cols, "c"), _names(rows, "r"), "rb")
+    def run():
+        # time the clustering too, not just the stored result
+        HM.rowOrdering = HM.columnOrdering = None
+        HM.rowLinkage = HM.columnLinkage = None
+        HM.makeMap(10., 10., io.BytesIO(), orderRows=ordered, orderColumns=ordered)
+    return run
+
+def benchMakeMap(cells):
+    return _benchMakeMap(cells, False)
+
+def benchMakeMapOrdered(cells):
+    return _benchMakeMap(cells, True)
+
+def _benchStackedBars(cells, useCollection):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from mikeplotlib.stackedBarGraph import StackedBarGrapher
+    data = makeMatrix(cells, columns=10)
+    cols = ["#%02x%02x%02x" % (20*i, 255-20*i, 128) for i in range(data.shape[1])]
+    SBG = StackedBarGrapher()
+    def run():
+        fig = Figure(figsize=(8, 6))
+        canvas = FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111)
+        SBG.stackedBarPlot(ax, data, cols, useCollection=useCollection)
+        canvas.draw()
+    return run
+
+def benchStackedBars(cells):
+    return _benchStackedBars(cells, False)
+
+def benchStackedBarsCollection(cells):
+    return _benchStackedBars(cells, True)
+
+def benchColorize(cells):
+    from mikeplotlib.cbCols import Cb2Cols
+    cb2 = Cb2Cols()
+    indices = np.random.RandomState(SEED).randint(0, 9, cells)
+    def run():
+        cb2.colorize("qualSet1", indices)
+    return run
+
+def benchGetRGB(cells):
+    from mikeplotlib.cbCols import Cb2Cols
+    cb2 = Cb2Cols()
+    names = list(cb2.maps)
+    picks = [names[i] for i in np.random.RandomState(SEED).randint(0, len(names), cells)]
+    def run():
+        for name in picks:
+            cb2.getRGB(name)
+    return run
+
+def benchQuantize(cells):
+    from mikeplotlib.cbCols import Cb2Cols
+    cb2 = Cb2Cols()
+    rgb = np.random.RandomState(SEED).randint(0, 256, (cells, 3)).astype(np.uint8)
+    def run():
+        cb2.quantize(rgb, "qualSet1")
+    return run
+
+# name -> (setup function, largest size run by default)
+# drawing one patch per cell tops out well before a million cells
+CASES = [("sineBow.makeColor", benchMakeColor, 1000000),
+         ("heatMap.makeMap", benchMakeMap, 10000),
+         ("heatMap.makeMap[ordered]", benchMakeMapOrdered, 10000),
+         ("stackedBarPlot", benchStackedBars, 10000),
+         ("stackedBarPlot[collection]", benchStackedBarsCollection, 1000000),
+         ("cbCols.getRGB", benchGetRGB, 1000000),
+         ("cbCols.colorize", benchColorize, 1000000),
+         ("cbCols.quantize", benchQuantize, 1000000)]
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+def measure(run, cells, repeats, minSeconds=0.1):
+    '''time a benchmark and find its peak memory
+
+    Fast benchmarks are looped until each sample takes at least
+    minSeconds (like timeit) so timer noise does not swamp them. Memory is
+    traced on a separate run because tracemalloc slows everything down
+
+    Inputs:
+     run - callable, one iteration of the benchmark
+     cells - int, size of the dataset
+     repeats - int, timed samples
+     minSeconds - float, shortest sample worth timing
+
+    Outputs:
+     dict of latency (best / median seconds per iteration), throughput
+     (cells per second, from the median) and peak traced bytes
+    '''
+    start = time.perf_counter()
+    run()   # also warms up caches and lazy imports
+    first = time.perf_counter() - start
+    number = max(1, int(minSeconds / max(first, 1e-9)))
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        for j in range(number):
+            run()
+        times.append((time.perf_counter() - start) / number)
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    median = float(np.median(times))
+    return {"cells" : cells,
+            "best" : min(times),
+            "median" : median,
+            "iterations" : number,
+            "cellsPerSecond" : cells / median if median > 0 else float("inf"),
+            "peakBytes" : peak}
+
+def environment():
+    '''versions that affect the numbers'''
+    import matplotlib
+    return {"python" : platform.python_version(),
+            "numpy" : np.__version__,
+            "matplotlib" : matplotlib.__version__,
+            "machine" : platform.platform(),
+            "processor" : platform.processor() or platform.machine()}
+
+def compare(results, baseline, tolerance, memoryTolerance):
+    '''find benchmarks that got slower or hungrier than the baseline
+
+    Inputs:
+     results - dict, name -> measurements for this run
+     baseline - dict, name -> measurements from the stored run
+     tolerance - float, allowed fractional increase in best time
+     memoryTolerance - float, allowed fractional increase in peak memory
+
+    Outputs:
+     [(name, what, old, new)] regressions
+    '''
+    regressions = []
+    for (name, new) in sorted(results.items()):
+        old = baseline.get(name)
+        if old is None:
+            continue
+        # best of the samples is the least affected by a busy machine
+        if new["best"] > old["best"] * (1. + tolerance):
+            regressions.append((name, "time", old["best"], new["best"]))
+        if new["peakBytes"] > old["peakBytes"] * (1. + memoryTolerance):
+            regressions.append((name, "memory", old["peakBytes"], new["peakBytes"]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark the mikeplotlib plotting paths")
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES,
+                        help="dataset sizes in cells")
+    parser.add_argument("--cases", nargs="+", default=None,
+                        help="only run benchmarks whose names contain one of these")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per benchmark")
+    parser.add_argument("--all-sizes", action="store_true",
+                        help="also run sizes above each benchmark's default limit")
+    parser.add_argument("--save", default=None, help="write results to this json file")
+    parser.add_argument("--compare", default=None, help="baseline json file to check against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed fractional slow down before flagging")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25,
+                        help="allowed fractional memory growth before flagging")
+    args = parser.parse_args()
+
+    results = {}
+    print("%-36s %10s %12s %14s %10s" % ("benchmark", "median s", "best s", "cells / s", "peak MB"))
+    for (case, setup, limit) in CASES:
+        if args.cases is not None and not any(c in case for c in args.cases):
+            continue
+        for cells in args.scales:
+            name = "%s@%d" % (case, cells)
+            if cells > limit and not args.all_sizes:
+                print("%-36s skipped, above %d cells (use --all-sizes)" % (name, limit))
+                continue
+            result = measure(setup(cells), cells, args.repeats)
+            results[name] = result
+            print("%-36s %10.4f %12.4f %14.0f %10.1f" % (name,
+                                                         result["median"],
+                                                         result["best"],
+                                                         result["cellsPerSecond"],
+                                                         result["peakBytes"] / 1048576.))
+
+    if args.save is not None:
+        with open(args.save, "w") as fh:
+            json.dump({"environment" : environment(), "results" : results},
+                      fh, indent=1, sort_keys=True)
+        print("saved %s" % args.save)
+
+    if args.compare is not None:
+        with open(args.compare) as fh:
+            stored = json.load(fh)
+        if stored.get("environment") != environment():
+            print("warning: baseline was made on %s" % stored.get("environment"))
+        regressions = compare(results, stored["results"], args.tolerance, args.memory_tolerance)
+        for (name, what, old, new) in regressions:
+            print("REGRESSION %-36s %-6s %.4g -> %.4g (x%.2f)" % (name, what, old, new, new / old))
+        if len(regressions) > 0:
+            return 1
+        print("no regressions against %s" % args.compare)
+    return 0
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
@@ -0,0 +1,50 @@
+###############################################################################
+#                                                                             #
+#    mikeplotlib - a collection of plotting / coloring tools                  #
+#                                                                             #
+#    Submodules (and the main classes in them) are only imported the first    #
+#    time they are used, so "import mikeplotlib" is cheap and does not pull   #
+#    in matplotlib or scipy.                                                  #
+#                                                                             #
+###############################################################################
+
+import importlib
+
+_SUBMODULES = ["asyncRender",
+               "barAccumulator",
+               "batchRender",
+               "cbCols",
+               "colorSpace",
+               "heatMap",
+               "htmlExport",
+               "quantileSketch",
+               "renderCache",
+               "sharedData",
+               "sineBow",
+               "stackedBarGraph",
+               "tiledMap"]
+
+_CLASSES = {"AsyncRenderer" : "asyncRender",
+            "Cb2Cols" : "cbCols",
+            "HeatMap" : "heatMap",
+            "HeatMapCanvas" : "heatMap",
+            "LiveStackedBarGrapher" : "stackedBarGraph",
+            "QuantileSketch" : "quantileSketch",
+            "RenderCache" : "renderCache",
+            "SharedArray" : "sharedData",
+            "SineBow" : "sineBow",
+            "StackedBarAccumulator" : "barAccumulator",
+            "StackedBarGrapher" : "stackedBarGraph"}
+
+__all__ = _SUBMODULES + sorted(_CLASSES)
+
+def __getattr__(name):
+    '''import submodules and classes on first use'''
+    if name in _SUBMODULES:
+        return importlib.import_module("." + name, __name__)
+    if name in _CLASSES:
+        return getattr(importlib.import_module("." + _CLASSES[name], __name__), name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
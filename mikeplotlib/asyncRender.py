@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+#    asyncRender.py - render figures to bytes without blocking an event loop  #
+#                                                                             #
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = "Michael Imelfort"
+__copyright__ = "Copyright 2014"
+__credits__ = ["Michael Imelfort"]
+__license__ = "GPL3"
+__version__ = "1.0.0"
+__maintainer__ = "Michael Imelfort"
+__email__ = "mike@mikeimelfort.com"
+__status__ = "Released"
+
+###############################################################################
+
+import asyncio
+import concurrent.futures
+import io
+import os
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+class RenderQueueFull(RuntimeError):
+    '''raised when too many renders are already waiting'''
+    pass
+
+def renderHeatMap(data,
+                  columnNames,
+                  rowNames,
+                  colorMap,
+                  width,
+                  height,
+                  format="png",
+                  heatMapArgs=None,
+                  mapArgs=None):
+    '''make a heatmap and return the encoded image
+
+    Runs in an executor so it has to be a plain module level function
+
+    Inputs:
+     data, columnNames, rowNames, colorMap - see HeatMap. data can be a
+                                             SharedArray or its handle
+     width, height - see HeatMap.makeMap
+     format - string, image format eg. "png"
+     heatMapArgs - dict, any other HeatMap arguments
+     mapArgs - dict, any other HeatMap.makeMap arguments
+
+    Outputs:
+     bytes
+    '''
+    from mikeplotlib.heatMap import HeatMap
+    from mikeplotlib.sharedData import resolveArray
+    HM = HeatMap(resolveArray(data), columnNames, rowNames, colorMap, **(heatMapArgs or {}))
+    return HM.makeMap(width, height, None, format=format, **(mapArgs or {}))
+
+def renderStackedBars(data, cols, format="png", plotArgs=None):
+    '''make a stacked bar graph and return the encoded image
+
+    Inputs:
+     data, cols - see StackedBarGrapher.stackedBarPlot. data can be a
+                  SharedArray or its handle
+     format - string, image format eg. "png"
+     plotArgs - dict, any other StackedBarGrapher.savePlot arguments
+
+    Outputs:
+     bytes
+    '''
+    from mikeplotlib.stackedBarGraph import StackedBarGrapher
+    from mikeplotlib.sharedData import resolveArray
+    buf = io.BytesIO()
+    StackedBarGrapher().savePlot(buf, resolveArray(data), cols, format=format, **(plotArgs or {}))
+    return buf.getvalue()
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+class AsyncRenderer(object):
+    '''Awaitable rendering on a managed pool of workers
+
+    At most maxWorkers renders run at once and at most maxQueue more may
+    wait for a free worker, beyond that RenderQueueFull is raised straight
+    away so a busy server can shed load. Cancelling or timing out an
+    await frees the caller at once. A render that has already started
+    still runs to the end in its worker and keeps its slot until then,
+    so the pool is never oversubscribed
+
+    Rendering does not touch pyplot so threads are safe and are the
+    default. Use processes=True for big maps where the GIL gets in the way,
+    and pass big matrices as sharedData.SharedArray so workers attach to
+    them instead of unpickling a copy
+    '''
+    def __init__(self,
+                 maxWorkers=None,
+                 maxQueue=64,
+                 processes=False):
+        '''
+        Default constructor.
+
+        Inputs:
+         maxWorkers - int, renders to run at once [number of cores]
+         maxQueue - int, renders allowed to wait for a worker
+         processes == True -> render in worker processes, not threads
+
+        Outputs:
+         None
+        '''
+        self.maxWorkers = maxWorkers or os.cpu_count() or 1
+        self.maxQueue = maxQueue
+        if processes:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.maxWorkers)
+        else:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.maxWorkers,
+                                                                   thread_name_prefix="mikeplotlib")
+        # made on first use so it belongs to the running loop
+        self._slots = None
+        self._waiting = 0
+        self._running = 0
+
+    @property
+    def waiting(self):
+        '''number of renders waiting for a worker'''
+        return self._waiting
+
+    @property
+    def running(self):
+        '''number of renders on a worker right now'''
+        return self._running
+
+    def _finished(self, future):
+        '''give a slot back once a worker is really done'''
+        self._running -= 1
+        self._slots.release()
+        # stop asyncio complaining about results no one waited for
+        if not future.cancelled():
+            future.exception()
+
+    async def _run(self, func, args):
+        '''wait for a slot then run a job on the executor'''
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.maxWorkers)
+        if self._slots.locked() and self._waiting >= self.maxQueue:
+            raise RenderQueueFull("%d renders already waiting" % self._waiting)
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        self._running += 1
+        future.add_done_callback(self._finished)
+        # shield so cancelling the caller does not give the slot back early
+        return await asyncio.shield(future)
+
+    async def submit(self, func, *args, timeout=None):
+        '''run any function on the pool
+
+        Inputs:
+         func - callable, picklable if processes == True
+         args - arguments for func
+         timeout - float, seconds to wait (queueing included) before
+                   raising asyncio.TimeoutError
+
+        Outputs:
+         whatever func returns
+        '''
+        return await asyncio.wait_for(self._run(func, args), timeout)
+
+    async def heatMap(self,
+                      data,
+                      columnNames,
+                      rowNames,
+                      colorMap,
+                      width,
+                      height,
+                      format="png",
+                      timeout=None,
+                      heatMapArgs=None,
+                      **mapArgs):
+        '''render a heatmap, see renderHeatMap
+
+        Inputs:
+         timeout - float, seconds before asyncio.TimeoutError
+         mapArgs - orderRows, dpi etc., see HeatMap.makeMap
+
+        Outputs:
+         encoded image bytes
+        '''
+        return await self.submit(renderHeatMap,
+                                 data,
+                                 columnNames,
+                                 rowNames,
+                                 colorMap,
+                                 width,
+                                 height,
+                                 format,
+                                 heatMapArgs,
+                                 mapArgs,
+                                 timeout=timeout)
+
+    async def stackedBars(self,
+                          data,
+                          cols,
+                          format="png",
+                          timeout=None,
+                          **plotArgs):
+        '''render a stacked bar graph, see renderStackedBars
+
+        Inputs:
+         timeout - float, seconds before asyncio.TimeoutError
+         plotArgs - figSize, title etc., see StackedBarGrapher.savePlot
+
+        Outputs:
+         encoded image bytes
+        '''
+        return await self.submit(renderStackedBars,
+                                 data,
+                                 cols,
+                                 format,
+                                 plotArgs,
+                                 timeout=timeout)
+
+    def close(self, wait=True):
+        '''shut the worker pool down
+
+        Inputs:
+         wait == True -> block until running renders are done
+
+        Outputs:
+         None
+        '''
+        self._executor.shutdown(wait=wait)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        # do not block the loop while workers finish up
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+#    barAccumulator.py - build stacked bar data from streamed records         #
+#                                                                             #
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = "Michael Imelfort"
+__copyright__ = "Copyright 2014"
+__credits__ = ["Michael Imelfort"]
+__license__ = "GPL3"
+__version__ = "1.0.0"
+__maintainer__ = "Michael Imelfort"
+__email__ = "mike@mikeimelfort.com"
+__status__ = "Released"
+
+###############################################################################
+
+import csv
+
+import numpy as np
+
+from mikeplotlib.stackedBarGraph import StackedBarGrapher
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+def readCSVChunks(fileName, chunkSize=100000, delimiter=',', skipHeader=False):
+    '''read (bar, level, value) records from a csv file a batch at a time
+
+    Inputs:
+     fileName - string, csv file to read
+     chunkSize - int, number of rows per batch
+     delimiter - string, field separator
+     skipHeader == True -> ignore the first line
+
+    Outputs:
+     a generator of [[bar, level, value]] batches
+    '''
+    with open(fileName) as fh:
+        reader = csv.reader(fh, delimiter=delimiter)
+        if skipHeader:
+            next(reader, None)
+        batch = []
+        for row in reader:
+            if len(row) == 0:
+                continue
+            batch.append(row)
+            if len(batch) == chunkSize:
+                yield batch
+                batch = []
+        if len(batch) > 0:
+            yield batch
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+class StackedBarAccumulator(object):
+    '''Sum streamed (bar, level, value) records into a bars x levels matrix
+
+    The matrix is allocated once up front and every chunk is scattered
+    into it with np.add.at, so peak memory is the matrix plus one chunk
+    '''
+    def __init__(self,
+                 bars,
+                 levels,
+                 dtype=np.float64):
+        '''
+        Default constructor.
+
+        Inputs:
+         bars - int or [string], number of bars or the bar names
+         levels - int or [string], number of levels or the level names
+         dtype - numpy type of the accumulated matrix
+
+        Outputs:
+         None
+        '''
+        (self.barNames, self._barIndex) = self._makeIndex(bars)
+        (self.levelNames, self._levelIndex) = self._makeIndex(levels)
+        self.data = np.zeros((self._size(bars), self._size(levels)), dtype=dtype)
+        self.numRecords = 0
+
+    def _size(self, keys):
+        '''number of entries described by a count or a list of names
+
+        Inputs:
+         keys - int or [string], a count or a list of names
+
+        Outputs:
+         an int
+        '''
+        if isinstance(keys, (int, np.integer)):
+            return int(keys)
+        return len(keys)
+
+    def _makeIndex(self, keys):
+        '''work out names and a name -> position lookup
+
+        Inputs:
+         keys - int or [string], a count or a list of names
+
+        Outputs:
+         (names, lookup) - both None when keys is a count
+        '''
+        if isinstance(keys, (int, np.integer)):
+            return (None, None)
+        names = list(keys)
+        lookup = dict((str(name), i) for (i, name) in enumerate(names))
+        if len(lookup) != len(names):
+            raise ValueError("names must be unique")
+        return (names, lookup)
+
+    def _toPositions(self, keys, lookup, size, what):
+        '''turn bar or level keys into matrix positions
+
+        Numeric keys (int or float arrays) are always positions and
+        floats must be whole numbers. Anything else is a name and is
+        looked up as str(key), or read as a position (eg. "3" from a csv
+        file) when there are no names. Names are looked up once per
+        distinct value in the chunk, not once per record
+
+        Inputs:
+         keys - array, positions or names
+         lookup - dict, str(name) -> position (None if there are no names)
+         size - int, number of valid positions
+         what - string, "bar" or "level" for error messages
+
+        Outputs:
+         an intp array of positions
+        '''
+        keys = np.asarray(keys)
+        if keys.dtype.kind in "iuf":
+            with np.errstate(invalid="ignore"):
+                positions = keys.astype(np.intp)
+            if keys.dtype.kind == "f" and np.any(positions != keys):
+                raise ValueError("%s positions must be whole numbers" % what)
+        elif lookup is None:
+            try:
+                positions = keys.astype(np.intp)
+            except (TypeError, ValueError):
+                raise ValueError("%ss have no names, use positions" % what)
+        else:
+            (uniques, inverse) = np.unique(keys.astype(str), return_inverse=True)
+            try:
+                mapped = np.array([lookup[key] for key in uniques], dtype=np.intp)
+            except KeyError as e:
+                raise ValueError("unknown %s: %s" % (what, e.args[0]))
+            positions = mapped[inverse.reshape(-1)]
+        if len(positions) > 0 and (positions.min() < 0 or positions.max() >= size):
+            raise ValueError("%s position out of range" % what)
+        return positions
+
+    def add(self, bars, levels, values):
+        '''add a chunk of records given as three parallel arrays
+
+        Numeric bars and levels (int or float arrays, floats must be whole
+        numbers) are positions, even when the bars or levels have names.
+        Anything else is a name, matched as str(key). So with bars named
+        [2019, 2020] use "2019" or position 0, not 2019
+
+        Inputs:
+         bars - array, bar position or name for each record
+         levels - array, level position or name for each record
+         values - array, value for each record
+
+        Outputs:
+         None
+        '''
+        (num_bars, num_levels) = self.data.shape
+        rows = self._toPositions(bars, self._barIndex, num_bars, "bar")
+        cols = self._toPositions(levels, self._levelIndex, num_levels, "level")
+        values = np.asarray(values, dtype=self.data.dtype)
+        # scatter into the flat view, repeated cells are summed
+        np.add.at(self.data.reshape(-1), rows * num_levels + cols, values)
+        self.numRecords += len(values)
+
+    def addChunk(self, chunk):
+        '''add a chunk of records in any of the supported layouts
+
+        Inputs:
+         chunk - one of:
+                 (bars, levels, values) tuple of arrays
+                 (n x 3) numeric array, bars and levels are positions
+                 structured array, the first three fields are used
+                 [[bar, level, value]] rows, eg. a csv reader batch
+
+        Bars and levels are positions or names as described in add
+
+        Outputs:
+         None
+        '''
+        if isinstance(chunk, tuple) and len(chunk) == 3:
+            self.add(*chunk)
+            return
+        if isinstance(chunk, np.ndarray):
+            if chunk.dtype.names is not None:
+                names = chunk.dtype.names[:3]
+                self.add(chunk[names[0]], chunk[names[1]], chunk[names[2]])
+                return
+            if chunk.ndim == 2 and chunk.shape[1] == 3:
+                self.add(chunk[:,0], chunk[:,1], chunk[:,2])
+                return
+            raise ValueError("array chunks must be (n x 3)")
+        # a batch of rows
+        if len(chunk) == 0:
+            return
+        (bars, levels, values) = zip(*[row[:3] for row in chunk])
+        self.add(bars, levels, np.asarray(values, dtype=np.float64))
+
+    def consume(self, chunks):
+        '''add every chunk from an iterator
+
+        Inputs:
+         chunks - iterable of chunks, see addChunk
+
+        Outputs:
+         self
+        '''
+        for chunk in chunks:
+            self.addChunk(chunk)
+        return self
+
+    def plot(self, ax, cols, **kwargs):
+        '''hand the accumulated matrix to StackedBarGrapher.stackedBarPlot
+
+        Bar and level names are used for xLabels and levelNames unless
+        they are passed in kwargs
+
+        Inputs:
+         ax - matplotlib axes, axes to plot onto
+         cols - [string], #RGB colors for each level
+         kwargs - any other stackedBarPlot arguments
+
+        Outputs:
+         None
+        '''
+        if self.barNames is not None:
+            kwargs.setdefault("xLabels", [str(name) for name in self.barNames])
+        if self.levelNames is not None:
+            kwargs.setdefault("levelNames", [str(name) for name in self.levelNames])
+        StackedBarGrapher().stackedBarPlot(ax, self.data, cols, **kwargs)
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
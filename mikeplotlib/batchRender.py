@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+#    batchRender.py - render heatmaps and stacked bar graphs in bulk          #
+#                                                                             #
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = "Michael Imelfort"
+__copyright__ = "Copyright 2014"
+__credits__ = ["Michael Imelfort"]
+__license__ = "GPL3"
+__version__ = "1.0.0"
+__maintainer__ = "Michael Imelfort"
+__email__ = "mike@mikeimelfort.com"
+__status__ = "Released"
+
+###############################################################################
+
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+KINDS = ["heatmap", "bars"]
+
+def readMatrix(fileName, header=True, rowNames=True):
+    '''read a matrix with optional row and column names
+
+    .npy files hold just the numbers and are memory mapped, so big ones
+    are paged in as they are used rather than read up front. Text files
+    are comma separated unless they end in .tsv / .txt, in which case
+    they are tab separated
+
+    Inputs:
+     fileName - string, file to read
+     header == True -> first line of a text file holds the column names
+     rowNames == True -> first field of each text line is the row name
+
+    Outputs:
+     (data, row_names, column_names) - float matrix and two [string]
+    '''
+    if fileName.endswith(".npy"):
+        data = np.load(fileName, mmap_mode="r")
+        if data.ndim != 2:
+            raise ValueError("%s does not hold a 2D array" % fileName)
+        return (data,
+                [str(i) for i in range(data.shape[0])],
+                [str(i) for i in range(data.shape[1])])
+
+    delimiter = "\t" if os.path.splitext(fileName)[1] in [".tsv", ".txt"] else ","
+    with open(fileName) as fh:
+        rows = [row for row in csv.reader(fh, delimiter=delimiter) if len(row) > 0]
+    column_names = None
+    if header:
+        column_names = rows[0][1:] if rowNames else rows[0]
+        rows = rows[1:]
+    if rowNames:
+        row_names = [row[0] for row in rows]
+        data = np.array([row[1:] for row in rows], dtype=np.float64)
+    else:
+        row_names = [str(i) for i in range(len(rows))]
+        data = np.array(rows, dtype=np.float64)
+    if column_names is None:
+        column_names = [str(i) for i in range(data.shape[1])]
+    return (data, row_names, column_names)
+
+def renderJob(job):
+    '''render one figure
+
+    Inputs:
+     job - dict, with keys:
+           input - string, data file
+           output - string, image file to write
+           kind - string, ["heatmap", "bars"]
+           options - dict, extra settings (see main for the defaults)
+
+    Outputs:
+     (output, status, message) - status is "done" or "failed"
+    '''
+    options = job.get("options", {})
+    try:
+        (data, row_names, column_names) = readMatrix(job["input"],
+                                                     header=options.get("header", True),
+                                                     rowNames=options.get("rowNames", True))
+        output_dir = os.path.dirname(job["output"])
+        if output_dir != "":
+            # other workers may be making the same directory
+            os.makedirs(output_dir, exist_ok=True)
+        if job["kind"] == "heatmap":
+            from mikeplotlib.heatMap import HeatMap
+            HM = HeatMap(data,
+                         column_names,
+                         row_names,
+                         options.get("colorMap", "rb"),
+                         scaling=options.get("scaling", "minmax"),
+                         percentiles=tuple(options.get("percentiles", (1., 99.))),
+                         scaleBy=options.get("scaleBy", "column"))
+            HM.makeMap(options.get("width", 10.),
+                       options.get("height", 10.),
+                       job["output"],
+                       orderRows=options.get("orderRows", False),
+                       orderColumns=options.get("orderColumns", False),
+                       showRowDendrogram=options.get("showRowDendrogram", False),
+                       showColumnDendrogram=options.get("showColumnDendrogram", False),
+                       figSize=tuple(options.get("figSize", (8, 10))),
+                       dpi=options.get("dpi", 300))
+        elif job["kind"] == "bars":
+            from mikeplotlib.stackedBarGraph import StackedBarGrapher
+            from mikeplotlib.cbCols import Cb2Cols
+            cols = options.get("cols")
+            if cols is None:
+                cols = Cb2Cols().distinctColors(data.shape[1], hexFormat=True)
+            StackedBarGrapher().savePlot(job["output"],
+                                         data,
+                                         cols,
+                                         figSize=tuple(options.get("figSize", (8, 6))),
+                                         dpi=options.get("dpi", 300),
+                                         title=options.get("title"),
+                                         legend=options.get("legend", False),
+                                         xLabels=row_names,
+                                         levelNames=column_names,
+                                         scale=options.get("scale", False),
+                                         useCollection=True,
+                                         binBars=options.get("binBars"))
+        else:
+            raise ValueError("unknown kind: %s" % job["kind"])
+    except Exception as e:
+        return (job.get("output"), "failed", "%s: %s" % (type(e).__name__, e))
+    return (job["output"], "done", "")
+
+def isUpToDate(job):
+    '''check if a job's output is newer than its input
+
+    Inputs:
+     job - dict, see renderJob
+
+    Outputs:
+     True if the output exists and is at least as new as the input
+    '''
+    if job.get("output") is None or job.get("input") is None:
+        return False
+    try:
+        return os.path.getmtime(job.get("output")) >= os.path.getmtime(job.get("input"))
+    except OSError:
+        return False
+
+def readManifest(fileName):
+    '''read a list of jobs
+
+    JSON manifests hold a list of job dicts (see renderJob). Anything else
+    is read as tab separated lines of: input kind output
+
+    Inputs:
+     fileName - string, manifest to read
+
+    Outputs:
+     [job dict]
+    '''
+    if fileName.endswith(".json"):
+        with open(fileName) as fh:
+            jobs = json.load(fh)
+        if not isinstance(jobs, list) or not all(isinstance(job, dict) for job in jobs):
+            raise ValueError("%s should hold a list of job objects" % fileName)
+        return jobs
+    jobs = []
+    with open(fileName) as fh:
+        for (line_number, line) in enumerate(fh, 1):
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            fields = line.split("\t")
+            if len(fields) < 3:
+                raise ValueError("%s line %d: expected input, kind and output separated by tabs"
+                                 % (fileName, line_number))
+            jobs.append({"input" : fields[0], "kind" : fields[1], "output" : fields[2]})
+    return jobs
+
+def makeJobs(args):
+    '''work out the jobs to run from the command line
+
+    Inputs:
+     args - argparse namespace, see main
+
+    Outputs:
+     [job dict]
+    '''
+    defaults = {"header" : not args.no_header,
+                "rowNames" : not args.no_row_names,
+                "colorMap" : args.color_map,
+                "orderRows" : args.order_rows,
+                "orderColumns" : args.order_columns,
+                "showRowDendrogram" : args.dendrograms and args.order_rows,
+                "showColumnDendrogram" : args.dendrograms and args.order_columns,
+                "scale" : args.scale,
+                "dpi" : args.dpi}
+    jobs = []
+    if args.manifest is not None:
+        jobs += readManifest(args.manifest)
+    for pattern in args.inputs:
+        for input_file in sorted(glob.glob(pattern)):
+            name = os.path.splitext(os.path.basename(input_file))[0]
+            jobs.append({"input" : input_file,
+                         "kind" : args.kind,
+                         "output" : os.path.join(args.out_dir, "%s.%s" % (name, args.format))})
+    for (index, job) in enumerate(jobs):
+        for key in ["input", "kind", "output"]:
+            if not job.get(key):
+                raise ValueError("manifest job %d has no %s" % (index + 1, key))
+        if job["kind"] not in KINDS:
+            raise ValueError("unknown kind %s for %s" % (job["kind"], job["input"]))
+        options = dict(defaults)
+        options.update(job.get("options", {}))
+        job["options"] = options
+    return jobs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="render heatmaps and stacked bar graphs from csv, tsv or .npy files")
+    parser.add_argument("inputs", nargs="*", help="input files or glob patterns")
+    parser.add_argument("-m", "--manifest", default=None,
+                        help="json list of jobs or tsv of: input kind output")
+    parser.add_argument("-k", "--kind", choices=KINDS, default="heatmap",
+                        help="what to draw for the positional inputs")
+    parser.add_argument("-o", "--out-dir", default=".", help="where to write images for the positional inputs")
+    parser.add_argument("-f", "--format", default="png", help="image format for the positional inputs")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes [all cores]")
+    parser.add_argument("--force", action="store_true", help="render even if the output is up to date")
+    parser.add_argument("--no-header", action="store_true", help="text inputs have no column names line")
+    parser.add_argument("--no-row-names", action="store_true", help="text inputs have no row names column")
+    parser.add_argument("--color-map", default="rb", help="sineBow map for heatmaps")
+    parser.add_argument("--order-rows", action="store_true", help="cluster heatmap rows")
+    parser.add_argument("--order-columns", action="store_true", help="cluster heatmap columns")
+    parser.add_argument("--dendrograms", action="store_true", help="draw dendrograms for clustered heatmaps")
+    parser.add_argument("--scale", action="store_true", help="scale stacked bars to the same height")
+    parser.add_argument("--dpi", type=int, default=300, help="resolution of the saved images")
+    args = parser.parse_args(argv)
+
+    jobs = makeJobs(args)
+    if len(jobs) == 0:
+        parser.error("no inputs found")
+    todo = [job for job in jobs if args.force or not isUpToDate(job)]
+    print("%d jobs, %d up to date" % (len(jobs), len(jobs) - len(todo)))
+
+    failures = 0
+    if len(todo) > 0:
+        workers = args.workers or multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(processes=min(workers, len(todo)))
+        try:
+            for (output, status, message) in pool.imap_unordered(renderJob, todo):
+                if status == "failed":
+                    failures += 1
+                    print("FAILED %s %s" % (output, message))
+                else:
+                    print("wrote %s" % output)
+        finally:
+            pool.close()
+            pool.join()
+    return 1 if failures > 0 else 0
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
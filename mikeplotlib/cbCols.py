@@ -37,25 +37,46 @@ __maintainer__ = "Michael Imelfort"
 __email__ = "mike@mikeimelfort.com"
 __status__ = "Released"
 
+###############################################################################
+
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+import numpy as np
+
+from mikeplotlib.colorSpace import rgbToLab, labToRgb, parseColor, splitMissing
+
 ###############################################################################
 ###############################################################################
 ###############################################################################
 ###############################################################################
 
-class Cb2Cols(object):
-    def __init__(self):
-        '''
-        Default constructor.
+# a palette as hex strings and as a read only (n x 3) uint8 array
+Palette = namedtuple('Palette', ['name', 'hex', 'rgb'])
 
-        Define all built in color values
+_PALETTES = None
+_HEX_MAPS = None
+_REGISTRY_LOCK = threading.Lock()
 
-        Inputs:
-         None
+_LUTS = {}                  # (map_name, n) -> (n x 3) uint8 array
+_LUT_LOCK = threading.Lock()
 
-        Output:
-         None
-        '''
-        self.maps = {
+_QUANTIZE_TABLES = {}       # map_name -> (2**24) uint8 palette positions
+_CANDIDATES = {}            # grid steps -> (rgb, lab) of the candidate colours
+_DISTINCT = {}              # (seed, lightness, steps) -> uint8 colour sequence
+_FULL_TABLE_PIXELS = 1 << 24    # uint8 inputs this big use a full table
+
+def _mapDefinitions():
+    '''All built in color values
+
+    Inputs:
+     None
+
+    Output:
+     dict of {map_name : {position : #RGB}}, positions start at 1
+    '''
+    return {
             "seqYellowGreen" : {
                 1 : "#ffffe5",
                 2 : "#f7fcb9",
@@ -462,6 +483,427 @@ class Cb2Cols(object):
                 8 : "#666666" }
         }
 
+def _buildRegistry():
+    '''build the shared, immutable palette registry (once)
+
+    Inputs:
+     None
+
+    Output:
+     None
+    '''
+    global _PALETTES, _HEX_MAPS
+    with _REGISTRY_LOCK:
+        if _PALETTES is not None:
+            return
+        palettes = {}
+        hex_maps = {}
+        for (name, colours) in _mapDefinitions().items():
+            hexes = tuple(colours[i] for i in sorted(colours))
+            rgb = np.array([[int(h[1:3], 16), int(h[3:5], 16), int(h[5:7], 16)] for h in hexes],
+                           dtype=np.uint8)
+            rgb.flags.writeable = False
+            palettes[name] = Palette(name, hexes, rgb)
+            hex_maps[name] = MappingProxyType(dict(colours))
+        _HEX_MAPS = MappingProxyType(hex_maps)
+        _PALETTES = MappingProxyType(palettes)
+
+def getPalettes():
+    '''get every built in palette
+
+    Inputs:
+     None
+
+    Output:
+     read only mapping of {map_name : Palette}
+    '''
+    if _PALETTES is None:
+        _buildRegistry()
+    return _PALETTES
+
+def getLUT(name, n=256):
+    '''get a palette stretched into n evenly spaced colours
+
+    Colours are interpolated in CIELAB so the steps look even. LUTs are
+    cached per (name, n)
+
+    Inputs:
+     name - string, name of the map eg. "seqBlues"
+     n - int, number of colours in the table
+
+    Output:
+     read only (n x 3) uint8 array
+    '''
+    key = (name, int(n))
+    lut = _LUTS.get(key)
+    if lut is None:
+        lab = rgbToLab(getPalette(name).rgb)
+        stops = np.linspace(0., 1., len(lab))
+        steps = np.linspace(0., 1., key[1])
+        interpolated = np.column_stack([np.interp(steps, stops, lab[:,i]) for i in range(3)])
+        lut = np.round(labToRgb(interpolated) * 255.).astype(np.uint8)
+        lut.flags.writeable = False
+        with _LUT_LOCK:
+            lut = _LUTS.setdefault(key, lut)
+    return lut
+
+def _nearestInLab(rgb, paletteLab, out):
+    '''find the nearest palette entry for some colours
+
+    Inputs:
+     rgb - array (n x 3) of colours, see rgbToLab
+     paletteLab - float array (k x 3), palette in CIELAB
+     out - uint8 array (n), where to write the palette positions
+
+    Outputs:
+     None
+    '''
+    lab = rgbToLab(rgb)
+    # |x - p|^2 = |x|^2 - 2 x.p + |p|^2 and |x|^2 does not change the argmin
+    distances = np.dot(lab, -2. * paletteLab.T)
+    distances += np.sum(paletteLab ** 2, axis=1)
+    out[:] = np.argmin(distances, axis=1)
+
+def _quantizeTable(name, chunkSize):
+    '''palette positions for every possible 24 bit colour
+
+    Inputs:
+     name - string, name of the map
+     chunkSize - int, number of colours to work on at a time
+
+    Outputs:
+     read only uint8 array of 2**24 positions indexed by (r<<16)|(g<<8)|b
+    '''
+    table = _QUANTIZE_TABLES.get(name)
+    if table is None:
+        palette_lab = rgbToLab(getPalette(name).rgb)
+        table = np.empty(1 << 24, dtype=np.uint8)
+        for start in range(0, 1 << 24, chunkSize):
+            codes = np.arange(start, min(start + chunkSize, 1 << 24), dtype=np.uint32)
+            rgb = np.empty((len(codes), 3), dtype=np.uint8)
+            rgb[:,0] = codes >> 16
+            rgb[:,1] = (codes >> 8) & 255
+            rgb[:,2] = codes & 255
+            _nearestInLab(rgb, palette_lab, table[start:start+len(codes)])
+        table.flags.writeable = False
+        with _LUT_LOCK:
+            table = _QUANTIZE_TABLES.setdefault(name, table)
+    return table
+
+def quantize(rgb, name, chunkSize=1 << 18):
+    '''snap colours to the nearest entry of a palette
+
+    Distances are measured in CIELAB. Work is done in bands of about
+    chunkSize colours along the first axis so memory stays bounded however
+    big the input is. A sliced or transposed input is only ever copied a
+    band at a time. Very large uint8 inputs go through a cached table of
+    all 2**24 colours instead
+
+    Inputs:
+     rgb - array (..., 3), integer arrays are 0 - 255, float arrays 0 - 1
+     name - string, name of the map eg. "qualSet1"
+     chunkSize - int, number of colours to work on at a time
+
+    Outputs:
+     uint8 array of shape rgb.shape[:-1], zero based palette positions
+    '''
+    rgb = np.asarray(rgb)
+    if rgb.shape[-1] != 3:
+        raise ValueError("expected an (..., 3) array of colours")
+    shape = rgb.shape[:-1]
+    if rgb.ndim == 1:
+        rgb = rgb.reshape(1, 3)
+    out = np.empty(rgb.shape[:-1], dtype=np.uint8)
+    num_colours = out.size
+    if rgb.dtype == np.uint8 and num_colours >= _FULL_TABLE_PIXELS:
+        table = _quantizeTable(name, chunkSize)
+        palette_lab = None
+    else:
+        table = None
+        palette_lab = rgbToLab(getPalette(name).rgb)
+    per_row = max(1, num_colours // max(1, rgb.shape[0]))
+    band_rows = max(1, chunkSize // per_row)
+    for row in range(0, rgb.shape[0], band_rows):
+        # a view for contiguous input, a band sized copy otherwise
+        flat = rgb[row:row+band_rows].reshape(-1, 3)
+        # out is C ordered so this is always a view
+        dest = out[row:row+band_rows].reshape(-1)
+        for start in range(0, flat.shape[0], chunkSize):
+            if table is not None:
+                chunk = flat[start:start+chunkSize].astype(np.uint32)
+                codes = (chunk[:,0] << 16) | (chunk[:,1] << 8) | chunk[:,2]
+                np.take(table, codes, out=dest[start:start+chunkSize])
+            else:
+                _nearestInLab(flat[start:start+chunkSize],
+                              palette_lab,
+                              dest[start:start+chunkSize])
+    return out.reshape(shape)
+
+def _candidateColours(steps):
+    '''an even grid of sRGB colours and their CIELAB coordinates
+
+    Inputs:
+     steps - int, number of levels per channel
+
+    Outputs:
+     (rgb, lab) - (steps**3 x 3) uint8 array, (steps**3 x 3) float array
+    '''
+    candidates = _CANDIDATES.get(steps)
+    if candidates is None:
+        levels = np.round(np.linspace(0, 255, steps)).astype(np.uint8)
+        rgb = np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), axis=-1).reshape(-1, 3)
+        candidates = (rgb, rgbToLab(rgb))
+        with _LUT_LOCK:
+            candidates = _CANDIDATES.setdefault(steps, candidates)
+    return candidates
+
+def _distinctCandidates(steps, lightness):
+    '''grid colours with L* in range, see _candidateColours
+
+    Outputs:
+     (rgb, lab, planes) - planes holds lab channel by channel as rows
+    '''
+    (rgb, lab) = _candidateColours(steps)
+    keep = (lab[:,0] >= lightness[0]) & (lab[:,0] <= lightness[1])
+    (rgb, lab) = (rgb[keep], lab[keep])
+    return (rgb, lab, np.ascontiguousarray(lab.T))
+
+def getDistinctColors(n, seed="qualSet1", lightness=(20., 90.), steps=32):
+    '''make n colours that are as far apart from each other as possible
+
+    Starts from the colours of a palette and then keeps adding the grid
+    colour furthest (in CIELAB) from every colour picked so far. When every
+    grid colour has been used the grid is made finer (up to all 2**24
+    colours) so the colours never repeat. The sequence for a bigger n
+    always starts with the one for a smaller n, so one cached sequence per
+    seed is extended as needed
+
+    Inputs:
+     n - int, number of colours to make
+     seed - string, palette to start from (None to start from scratch)
+     lightness - (float, float), only pick new colours with L* in range
+     steps - int, grid levels per channel for the candidate colours
+
+    Outputs:
+     read only (n x 3) uint8 array
+
+    Raises:
+     ValueError if there are not n colours with L* in range
+    '''
+    if n > 1 << 24:
+        raise ValueError("there are only %d RGB colours" % (1 << 24))
+    key = (seed, tuple(lightness), steps)
+    sequence = _DISTINCT.get(key)
+    if sequence is None or len(sequence) < n:
+        (rgb, lab, planes) = _distinctCandidates(steps, lightness)
+
+        if sequence is None:
+            if seed is None:
+                # start from the most saturated candidate
+                sequence = rgb[[np.argmax(np.sum(lab[:,1:] ** 2, axis=1))]]
+            else:
+                sequence = np.array(getPalette(seed).rgb)
+        picked = [sequence]
+
+        # squared distance from every candidate to its closest picked
+        # colour, channels kept in separate rows as that is much faster
+        def closer(colour, planes, min_dist):
+            dist = (planes[0] - colour[0]) ** 2
+            dist += (planes[1] - colour[1]) ** 2
+            dist += (planes[2] - colour[2]) ** 2
+            np.minimum(min_dist, dist, out=min_dist)
+        min_dist = np.full(len(lab), np.inf)
+        for colour in rgbToLab(sequence):
+            closer(colour, planes, min_dist)
+        count = len(sequence)
+        while count < n:
+            best = np.argmax(min_dist) if len(min_dist) > 0 else 0
+            if len(min_dist) == 0 or min_dist[best] == 0.:
+                # every candidate is taken, a 2s - 1 grid keeps the old
+                # points and adds the ones half way between them
+                if steps >= 256:
+                    raise ValueError("only %d distinct colours have L* in %s" % \
+                                     (count, tuple(lightness)))
+                steps = min(256, 2 * steps - 1)
+                (rgb, lab, planes) = _distinctCandidates(steps, lightness)
+                min_dist = np.full(len(lab), np.inf)
+                for colour in rgbToLab(np.concatenate(picked)):
+                    closer(colour, planes, min_dist)
+                continue
+            picked.append(rgb[best:best+1])
+            closer(lab[best], planes, min_dist)
+            count += 1
+
+        sequence = np.concatenate(picked)
+        sequence.flags.writeable = False
+        with _LUT_LOCK:
+            if len(_DISTINCT.get(key, ())) < len(sequence):
+                _DISTINCT[key] = sequence
+    return sequence[:n]
+
+def getPalette(name):
+    '''get one built in palette
+
+    Inputs:
+     name - string, name of the map eg. "qualSet1"
+
+    Output:
+     a Palette, rgb is a read only (n x 3) uint8 array
+    '''
+    return getPalettes()[name]
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+class Cb2Cols(object):
+    def __init__(self):
+        '''
+        Default constructor.
+
+        The colour maps live in a shared registry that is built the
+        first time it is used, so this costs nothing
+
+        Inputs:
+         None
+
+        Output:
+         None
+        '''
+        pass
+
+    @property
+    def maps(self):
+        '''read only {map_name : {position : #RGB}}, positions start at 1'''
+        if _HEX_MAPS is None:
+            _buildRegistry()
+        return _HEX_MAPS
+
+    def getRGB(self, name):
+        '''get a map as an array
+
+        Inputs:
+         name - string, name of the map eg. "qualSet1"
+
+        Output:
+         read only (n x 3) uint8 array, row i is maps[name][i+1]
+        '''
+        return getPalette(name).rgb
+
+    def colorize(self, name, indices, wrap=False):
+        '''look up the colours for an array of (zero based) map positions
+
+        Inputs:
+         name - string, name of the map eg. "qualSet1"
+         indices - int array, any shape, positions in the map
+         wrap == True -> cycle through the map for positions past the end
+
+        Output:
+         uint8 array of shape indices.shape + (3,)
+        '''
+        return np.take(getPalette(name).rgb,
+                       indices,
+                       axis=0,
+                       mode='wrap' if wrap else 'raise')
+
+    def quantize(self, rgb, name, chunkSize=1 << 18):
+        '''snap colours to the nearest entry of a map
+
+        Inputs:
+         rgb - array (..., 3), integer arrays are 0 - 255, float arrays 0 - 1
+         name - string, name of the map eg. "qualSet1"
+         chunkSize - int, number of colours to work on at a time
+
+        Output:
+         uint8 array of zero based map positions, see quantize
+        '''
+        return quantize(rgb, name, chunkSize=chunkSize)
+
+    def distinctColors(self, n, seed="qualSet1", hexFormat=False):
+        '''get n colours that are easy to tell apart
+
+        Inputs:
+         n - int, number of colours to make
+         seed - string, map whose colours come first, see getDistinctColors
+         hexFormat == True -> return #RGB strings
+
+        Output:
+         (n x 3) uint8 array or a list of #RGB strings
+        '''
+        colours = getDistinctColors(n, seed=seed)
+        if hexFormat:
+            return ["#%02x%02x%02x" % tuple(colour) for colour in colours]
+        return colours
+
+    def makeLUT(self, name, n=256):
+        '''get a map as a continuous n step colour table
+
+        Inputs:
+         name - string, name of the map eg. "seqBlues"
+         n - int, number of colours in the table
+
+        Output:
+         read only (n x 3) uint8 array, see getLUT
+        '''
+        return getLUT(name, n)
+
+    def makeColormap(self, name, n=256):
+        '''get a map as a matplotlib colormap
+
+        Inputs:
+         name - string, name of the map eg. "seqBlues"
+         n - int, number of colours in the colormap
+
+        Output:
+         a matplotlib ListedColormap
+        '''
+        from matplotlib.colors import ListedColormap
+        return ListedColormap(getLUT(name, n) / 255., name=name)
+
+    def colorizeValues(self,
+                       name,
+                       values,
+                       lowerBound=None,
+                       upperBound=None,
+                       n=256,
+                       missingColor="#d9d9d9"):
+        '''colour continuous values with an interpolated map
+
+        Inputs:
+         name - string, name of the map eg. "seqBlues"
+         values - float array or masked array, any shape
+         lowerBound - float, value mapped to the first colour (default
+                      smallest finite value)
+         upperBound - float, value mapped to the last colour (default
+                      largest finite value)
+         n - int, number of steps in the colour table
+         missingColor - #RGB string or RGB triple for NaN / masked values
+
+        Values outside the bounds, -inf and inf included, get the end
+        colours
+
+        Output:
+         uint8 array of shape values.shape + (3,)
+        '''
+        (values, missing) = splitMissing(values)
+        present = values[np.isfinite(values) & ~missing]
+        if lowerBound is None:
+            lowerBound = np.min(present) if present.size > 0 else 0.
+        if upperBound is None:
+            upperBound = np.max(present) if present.size > 0 else 0.
+        if not (np.isfinite(lowerBound) and np.isfinite(upperBound)):
+            raise ValueError("colour bounds must be finite")
+        span = float(upperBound - lowerBound)
+        if span == 0:
+            span = 1.
+        positions = (values - lowerBound) * ((n - 1) / span)
+        np.clip(positions, 0, n - 1, out=positions)
+        colours = np.take(getLUT(name, n), np.rint(positions).astype(np.intp), axis=0)
+        if np.any(missing):
+            colours[missing] = parseColor(missingColor)
+        return colours
+
     def demo(self):
         '''Draw all the colours!
 
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+#    colorSpace.py - vectorized conversions between sRGB and CIELAB           #
+#                                                                             #
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = "Michael Imelfort"
+__copyright__ = "Copyright 2014"
+__credits__ = ["Michael Imelfort"]
+__license__ = "GPL3"
+__version__ = "1.0.0"
+__maintainer__ = "Michael Imelfort"
+__email__ = "mike@mikeimelfort.com"
+__status__ = "Released"
+
+###############################################################################
+
+import numpy as np
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+# sRGB (linear) -> XYZ for a D65 white point
+_RGB_TO_XYZ = np.array([[0.4124564, 0.3575761, 0.1804375],
+                        [0.2126729, 0.7151522, 0.0721750],
+                        [0.0193339, 0.1191920, 0.9503041]])
+_XYZ_TO_RGB = np.linalg.inv(_RGB_TO_XYZ)
+_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+_EPSILON = 216. / 24389.
+_KAPPA = 24389. / 27.
+
+def rgbToLab(rgb):
+    '''convert sRGB colours to CIELAB
+
+    Inputs:
+     rgb - array (..., 3), integer arrays are taken as 0 - 255 and float
+           arrays as 0 - 1
+
+    Outputs:
+     float array (..., 3) of L*, a*, b*
+    '''
+    rgb = np.asarray(rgb)
+    if rgb.dtype.kind in "iu":
+        rgb = rgb / 255.
+    else:
+        rgb = rgb.astype(np.float64)
+    # undo the sRGB gamma
+    linear = np.where(rgb <= 0.04045,
+                      rgb / 12.92,
+                      ((rgb + 0.055) / 1.055) ** 2.4)
+    xyz = np.dot(linear, _RGB_TO_XYZ.T) / _WHITE
+    f = np.where(xyz > _EPSILON,
+                 np.cbrt(xyz),
+                 (_KAPPA * xyz + 16.) / 116.)
+    lab = np.empty(f.shape)
+    lab[...,0] = 116. * f[...,1] - 16.
+    lab[...,1] = 500. * (f[...,0] - f[...,1])
+    lab[...,2] = 200. * (f[...,1] - f[...,2])
+    return lab
+
+def labToRgb(lab):
+    '''convert CIELAB colours to sRGB
+
+    Colours outside the sRGB gamut are clipped
+
+    Inputs:
+     lab - array (..., 3) of L*, a*, b*
+
+    Outputs:
+     float array (..., 3) of sRGB values in 0 - 1
+    '''
+    lab = np.asarray(lab, dtype=np.float64)
+    f = np.empty(lab.shape)
+    f[...,1] = (lab[...,0] + 16.) / 116.
+    f[...,0] = f[...,1] + lab[...,1] / 500.
+    f[...,2] = f[...,1] - lab[...,2] / 200.
+    xyz = np.where(f ** 3 > _EPSILON,
+                   f ** 3,
+                   (116. * f - 16.) / _KAPPA) * _WHITE
+    linear = np.clip(np.dot(xyz, _XYZ_TO_RGB.T), 0., 1.)
+    return np.where(linear <= 0.0031308,
+                    linear * 12.92,
+                    1.055 * linear ** (1. / 2.4) - 0.055)
+
+def parseColor(color):
+    '''turn a #RGB hex string or an RGB triple into a uint8 RGB array
+
+    Inputs:
+     color - string "#rrggbb", or (r, g, b) as 0 - 255 ints or 0 - 1 floats
+
+    Outputs:
+     uint8 array of length 3
+    '''
+    if isinstance(color, str):
+        code = color.lstrip("#")
+        if len(code) != 6:
+            raise ValueError("can not read color: %s" % color)
+        return np.array([int(code[i:i+2], 16) for i in (0, 2, 4)], dtype=np.uint8)
+    rgb = np.asarray(color)
+    if rgb.shape != (3,):
+        raise ValueError("can not read color: %s" % (color,))
+    if rgb.dtype.kind == "f":
+        rgb = np.round(rgb * 255.)
+    return rgb.astype(np.uint8)
+
+def splitMissing(values, fill=0.):
+    '''separate missing values (NaNs and masked entries) from the rest
+
+    Inputs:
+     values - array or masked array of numbers
+     fill - float, what to put in place of the missing values
+
+    Outputs:
+     (float array with missing values replaced by fill, bool missing mask)
+    '''
+    if np.ma.isMaskedArray(values):
+        missing = np.ma.getmaskarray(values)
+        values = np.ma.getdata(values)
+    else:
+        missing = False
+    values = np.asarray(values, dtype=np.float64)
+    missing = missing | np.isnan(values)
+    if missing.any():
+        values = np.where(missing, fill, values)
+    return (values, missing)
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
@@ -32,19 +32,45 @@ __status__ = "Released"
 ###############################################################################
 
 import numpy as np
-np.seterr(all='raise')
 
+import io
 import os
+import warnings
 
-from matplotlib import pyplot as plt
-from matplotlib.patches import Rectangle, FancyBboxPatch
-import matplotlib.font_manager as fm
-
-from scipy.spatial.distance import pdist
-from scipy.cluster.hierarchy import linkage, leaves_list
 from mikeplotlib.sineBow import SineBow
+from mikeplotlib.quantileSketch import QuantileSketch
+
+# matplotlib, scipy and pkg_resources are slow to import so they are
+# only pulled in by the methods that need them
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
 
-from pkg_resources import resource_filename
+def colorValues(values, lowerBounds, upperBounds, colorMap, missingColor="#d9d9d9"):
+    '''color a block of heatmap values, each column with its own bounds
+
+    Scaling every column into 0 - 1 first lets one SineBow color the whole
+    block and gives exactly the colors of a SineBow per column
+
+    Inputs:
+     values - float array (rows x columns), may hold NaNs
+     lowerBounds - float array (columns), value of the first color
+     upperBounds - float array (columns), value of the last color
+     colorMap - string, sineBow type colormap
+     missingColor - #RGB string or RGB triple for NaNs
+
+    Outputs:
+     uint8 array (rows x columns x 3) of RGB values
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    lowers = np.asarray(lowerBounds, dtype=np.float64)
+    uppers = np.asarray(upperBounds, dtype=np.float64)
+    # NaNs go through clip untouched and come out as missingColor
+    scaled = (np.clip(values, lowers, uppers) - lowers) / (uppers - lowers)
+    return SineBow(1., lowerBound=0., mapType=colorMap).makeColorArray(scaled,
+                                                                       missingColor=missingColor)
 
 ###############################################################################
 ###############################################################################
@@ -52,134 +78,573 @@ from pkg_resources import resource_filename
 ###############################################################################
 
 class HeatMap(object):
+    @np.errstate(all='raise')
     def __init__(self,
                  data,
                  columnNames,
                  rowNames,
                  colorMap,
+                 scaling="minmax",
+                 percentiles=(1., 99.),
+                 scaleBy="column",
+                 sketch=None,
+                 missingColor="#d9d9d9"
                  ):
         '''make a heatmap
 
+        Missing values (NaNs or masked entries of a masked array) are left
+        out of the color bounds and drawn in missingColor
+
         Inputs:
          data - [[float]], data to use in heatmap. Rows x Columns
          columnNames - [string], column names used for labeling
          rowNames - [string], row names used for labeling
          colorMap - string, sineBow type colormap
+         scaling - string, how to set the color bounds
+                   ["minmax", "percentile"]
+         percentiles - (float, float), lower and upper percentiles used
+                       when scaling == "percentile". Values outside are
+                       clipped to the end colors
+         scaleBy - string, bound each column on its own or use one set
+                   of bounds for the whole matrix ["column", "global"]
+         sketch - QuantileSketch, precomputed sketch (eg. built while
+                  streaming the data). Must have one column per data
+                  column (scaleBy == "column") or a single column
+         missingColor - #RGB string or RGB triple for missing cells
 
         Outputs:
          None
         '''
         self.colorMap = colorMap
+        self.missingColor = missingColor
+        if np.ma.isMaskedArray(data):
+            # NaNs from here on so every path sees the same thing
+            data = np.ma.filled(data.astype(np.float64), np.nan)
         self.data = data
 
         self.rowNames = rowNames
         self.columnNames = columnNames
 
         # work out heatmap color ranges
-        self.SBs = []
-        for c in range(len(self.columnNames)):
-            vec = [self.data[r][c] for r in range(len(self.rowNames))]
-            max = np.max(vec)
-            min = np.min(vec)
-            if min == max == 0:
-                max = 1
-            self.SBs.append(SineBow(max, lowerBound=min, mapType=self.colorMap))
-
+        num_cols = len(self.columnNames)
+        if scaleBy not in ["column", "global"]:
+            raise ValueError("unknown scaleBy: %s" % scaleBy)
+        if scaling == "minmax":
+            values = np.asarray(self.data, dtype=np.float64)
+            with warnings.catch_warnings():
+                # all NaN columns are dealt with below
+                warnings.simplefilter("ignore", RuntimeWarning)
+                if scaleBy == "column":
+                    lowers = np.nanmin(values, axis=0)
+                    uppers = np.nanmax(values, axis=0)
+                else:
+                    lowers = np.repeat(np.nanmin(values), num_cols)
+                    uppers = np.repeat(np.nanmax(values), num_cols)
+        elif scaling == "percentile":
+            if sketch is None:
+                sketch = self.makeSketch(self.data, scaleBy=scaleBy)
+            (lowers, uppers) = sketch.percentileBounds(percentiles[0],
+                                                       percentiles[1])
+            if sketch.numColumns == 1:
+                lowers = np.repeat(lowers, num_cols)
+                uppers = np.repeat(uppers, num_cols)
+            elif sketch.numColumns != num_cols:
+                raise ValueError("sketch has %d columns but data has %d" % \
+                                 (sketch.numColumns, num_cols))
+        else:
+            raise ValueError("unknown scaling: %s" % scaling)
+
+        self.lowerBounds = np.array(lowers, dtype=np.float64)
+        self.upperBounds = np.array(uppers, dtype=np.float64)
+        # columns with nothing but missing values
+        empty = np.isnan(self.lowerBounds) | np.isnan(self.upperBounds)
+        self.lowerBounds[empty] = 0.
+        self.upperBounds[empty] = 0.
+        # a flat column still needs some span to color against
+        flat = self.lowerBounds == self.upperBounds
+        self.upperBounds[flat] = self.lowerBounds[flat] + 1.
+        self.SBs = [SineBow(self.upperBounds[c],
+                            lowerBound=self.lowerBounds[c],
+                            mapType=self.colorMap) for c in range(num_cols)]
+
+        from pkg_resources import resource_filename
         self.fontPath = os.path.abspath(resource_filename('mikeplotlib',
                                                           'Menlo-Regular.ttf'))
         # some default values
         self.gapPerc = 0.02     # percent of the block width to use as a gap
 
+        # clustering results, filled by cluster() or loadClustering()
+        self.rowLinkage = None
+        self.columnLinkage = None
+        self.rowOrdering = None
+        self.columnOrdering = None
+        # loaded clusterings can not be worked out from the data alone
+        # so they have to be part of any render cache key
+        self._loadedClustering = False
+
+    @staticmethod
+    def makeSketch(data, scaleBy="column", k=1024, chunkSize=65536):
+        '''build a quantile sketch of the data in one streaming pass
+
+        Inputs:
+         data - [[float]] or iterable of row chunks. Rows x Columns. NaNs
+                and masked entries are ignored
+         scaleBy - string, one sketch per column or one for all values
+                   ["column", "global"]
+         k - int, compactor block size of the sketch
+         chunkSize - int, number of rows to feed the sketch at a time
+
+        Outputs:
+         a QuantileSketch
+        '''
+        if np.ma.isMaskedArray(data):
+            data = np.ma.filled(data.astype(np.float64), np.nan)
+        if isinstance(data, np.ndarray) or isinstance(data, list):
+            values = np.asarray(data, dtype=np.float64)
+            chunks = (values[i:i+chunkSize] for i in range(0, values.shape[0], chunkSize))
+        else:
+            chunks = data
+        sketch = None
+        for chunk in chunks:
+            if np.ma.isMaskedArray(chunk):
+                chunk = np.ma.filled(chunk.astype(np.float64), np.nan)
+            chunk = np.atleast_2d(np.asarray(chunk, dtype=np.float64))
+            if sketch is None:
+                num_cols = chunk.shape[1] if scaleBy == "column" else 1
+                sketch = QuantileSketch(numColumns=num_cols, k=k)
+            if scaleBy == "column":
+                sketch.update(chunk)
+            else:
+                sketch.update(chunk.ravel())
+        if sketch is None:
+            raise ValueError("no data to sketch")
+        return sketch
+
+    def cluster(self, orderRows=True, orderColumns=True):
+        '''hierarchically cluster rows and / or columns of the data
+
+        The linkage matrices and leaf orderings are kept on the object
+        (rowLinkage, columnLinkage, rowOrdering, columnOrdering) so they
+        can be reused by makeMap or saved with saveClustering. Missing
+        values are replaced by their column mean for clustering
+
+        Inputs:
+         orderRows == True -> cluster the rows
+         orderColumns == True -> cluster the columns
+
+        Outputs:
+         None
+        '''
+        from scipy.spatial.distance import pdist
+        from scipy.cluster.hierarchy import linkage, leaves_list
+
+        if not (orderRows or orderColumns):
+            return
+        data = np.asarray(self.data, dtype=np.float64)
+        missing = np.isnan(data)
+        if missing.any():
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                means = np.nan_to_num(np.nanmean(data, axis=0))
+            data = np.where(missing, means, data)
+
+        if orderRows:
+            # work out linkage
+            row_dist = pdist(data)
+            self.rowLinkage = linkage(row_dist)
+            self.rowOrdering = leaves_list(self.rowLinkage)
+
+        if orderColumns:
+            column_dist = pdist(np.transpose(data))
+            self.columnLinkage = linkage(column_dist)
+            self.columnOrdering = leaves_list(self.columnLinkage)
+
+    def orderings(self, orderRows=False, orderColumns=False):
+        '''row and column display orders, clustering first if needed
+
+        Stored orderings are used as they are and stored linkages give
+        their leaf order, only sides with neither are clustered
+
+        Inputs:
+         orderRows == True -> order rows by hierarchical clustering
+         orderColumns == True -> order columns by hierarchical clustering
+
+        Outputs:
+         (row ordering, column ordering) intp arrays, unordered sides
+         come back as 0, 1, 2, ...
+        '''
+        (rows, cols) = np.shape(self.data)
+        self._orderFromLinkage()
+        self.cluster(orderRows=orderRows and self.rowOrdering is None,
+                     orderColumns=orderColumns and self.columnOrdering is None)
+        if orderRows:
+            row_ordering = self.rowOrdering
+        else:
+            row_ordering = np.arange(rows)
+
+        if orderColumns:
+            column_ordering = self.columnOrdering
+        else:
+            column_ordering = np.arange(cols)
+        return (np.asarray(row_ordering, dtype=np.intp),
+                np.asarray(column_ordering, dtype=np.intp))
+
+    def saveClustering(self, fileName):
+        '''save the clustering results to a compressed .npz file
+
+        Inputs:
+         fileName - string or file, where to write the clustering
+
+        Outputs:
+         None
+        '''
+        arrays = {}
+        for name in ["rowLinkage", "columnLinkage", "rowOrdering", "columnOrdering"]:
+            value = getattr(self, name)
+            if value is not None:
+                arrays[name] = value
+        if len(arrays) == 0:
+            raise ValueError("nothing to save, call cluster() first")
+        np.savez_compressed(fileName, **arrays)
+
+    def loadClustering(self, fileName):
+        '''load clustering results written by saveClustering
+
+        Inputs:
+         fileName - string or file, .npz file to read
+
+        Outputs:
+         None
+        '''
+        (rows, cols) = np.shape(self.data)
+        with np.load(fileName) as saved:
+            for (name, size) in [("rowLinkage", rows-1),
+                                 ("columnLinkage", cols-1),
+                                 ("rowOrdering", rows),
+                                 ("columnOrdering", cols)]:
+                if name in saved.files:
+                    value = saved[name]
+                    if len(value) != size:
+                        raise ValueError("%s in %s does not match the data shape" % \
+                                         (name, fileName))
+                    setattr(self, name, value)
+                    self._loadedClustering = True
+        # a linkage on its own still fixes the leaf order, do not let a
+        # later cluster() throw it away
+        self._orderFromLinkage()
+
+    def _orderFromLinkage(self):
+        '''fill in missing orderings from linkages we already have
+
+        Outputs:
+         None
+        '''
+        if self.rowOrdering is None and self.rowLinkage is not None or \
+           self.columnOrdering is None and self.columnLinkage is not None:
+            from scipy.cluster.hierarchy import leaves_list
+            if self.rowOrdering is None and self.rowLinkage is not None:
+                self.rowOrdering = leaves_list(self.rowLinkage)
+            if self.columnOrdering is None and self.columnLinkage is not None:
+                self.columnOrdering = leaves_list(self.columnLinkage)
+
+    def _dendrogramLines(self, linkageMatrix, step, offset):
+        '''work out the line segments of a dendrogram
+
+        Inputs:
+         linkageMatrix - array, scipy linkage matrix
+         step - float, distance between neighbouring leaves
+         offset - float, position of the first leaf
+
+        Outputs:
+         ([polyline], max_height) - each polyline is [(leaf_pos, height)]
+        '''
+        from scipy.cluster.hierarchy import dendrogram
+        tree = dendrogram(linkageMatrix, no_plot=True)
+        # scipy puts leaf i at 10i + 5
+        lines = [list(zip((np.array(xs) - 5.) / 10. * step + offset, ys))
+                 for (xs, ys) in zip(tree['icoord'], tree['dcoord'])]
+        max_height = np.max(tree['dcoord']) if len(tree['dcoord']) > 0 else 0.
+        if max_height == 0:
+            max_height = 1.
+        return (lines, max_height)
+
     def makeMap(self,
                 width,
                 height,
-                fileName,
+                fileName=None,
                 orderRows=False,
-                orderColumns=False):
+                orderColumns=False,
+                showRowDendrogram=False,
+                showColumnDendrogram=False,
+                cache=None,
+                figSize=(8,10),
+                dpi=300,
+                format=None,
+                compressLevel=None,
+                canvas=None):
         '''make a heatmap
 
+        Clustering results already stored on the object are reused
+
         Inputs:
          width - float, width of the heatmap
          height - float, height of the heatmap
+         fileName - string or file, where to save the heatmap. None to
+                    get the encoded image back instead
+         orderRows == True -> order rows by hierarchical clustering
+         orderColumns == True -> order columns by hierarchical clustering
+         showRowDendrogram == True -> draw the row dendrogram on the left
+         showColumnDendrogram == True -> draw the column dendrogram on top
+         cache - RenderCache, serve repeated maps from here instead of
+                 drawing them again
+         figSize - (float, float), figure size in inches
+         dpi - int, resolution of the saved image
+         format - string, image format eg. "png" (default from fileName,
+                  or "png" when there is no file name)
+         compressLevel - int, 0 - 9 zlib level for png images. Low levels
+                         save faster but make bigger files
+         canvas - HeatMapCanvas, reuse this figure instead of laying out
+                  a new one. Must have been made for the same shape,
+                  width, height and dendrograms
 
         Outputs:
-         None
+         bytes of the encoded image if fileName is None, else None
+        '''
+        from mikeplotlib.renderCache import imageFormat, makeKey
+
+        layout = (width, height, orderRows, orderColumns,
+                  showRowDendrogram, showColumnDendrogram)
+        target = io.BytesIO() if fileName is None else fileName
+
+        def draw(target, fmt=None):
+            fig = self._drawMap(*layout, canvas=canvas)
+            fig.set_size_inches(*figSize)
+            save_args = {}
+            if compressLevel is not None and (fmt or imageFormat(target)) == "png":
+                save_args["pil_kwargs"] = {"compress_level" : compressLevel}
+            fig.savefig(target, dpi=dpi, format=fmt, **save_args)
+            del fig
+
+        if cache is None:
+            draw(target, format)
+        else:
+            clustering = None
+            if self._loadedClustering:
+                clustering = [self.rowOrdering, self.columnOrdering,
+                              self.rowLinkage, self.columnLinkage]
+            key = makeKey("heatmap",
+                          np.asarray(self.data, dtype=np.float64),
+                          [str(name) for name in self.rowNames],
+                          [str(name) for name in self.columnNames],
+                          self.colorMap,
+                          self.missingColor,
+                          self.lowerBounds,
+                          self.upperBounds,
+                          self.gapPerc,
+                          os.path.basename(self.fontPath),
+                          clustering,
+                          layout,
+                          tuple(figSize),
+                          dpi,
+                          compressLevel)
+            cache.render(key, target, draw, format=format)
+        if fileName is None:
+            return target.getvalue()
+
+    def cellColors(self, rows=None, columns=None):
+        '''work out the color of every cell in one vectorized pass
+
+        Inputs:
+         rows - int array, rows to color, in this order [all]
+         columns - int array, columns to color, in this order [all]
+
+        Outputs:
+         uint8 array (rows x columns x 3) of RGB values, missing cells
+         get missingColor
+        '''
+        values = np.asarray(self.data)
+        if rows is not None:
+            values = values[rows]
+        if columns is None:
+            columns = np.arange(values.shape[1])
+        else:
+            values = values[:,columns]
+        return colorValues(values,
+                           self.lowerBounds[columns],
+                           self.upperBounds[columns],
+                           self.colorMap,
+                           self.missingColor)
+
+    @np.errstate(all='raise')
+    def _drawMap(self,
+                 width,
+                 height,
+                 orderRows,
+                 orderColumns,
+                 showRowDendrogram,
+                 showColumnDendrogram,
+                 canvas=None):
+        '''draw a heatmap, see makeMap
+
+        Inputs:
+         canvas - HeatMapCanvas, draw on this instead of a new figure
+
+        Outputs:
+         a matplotlib Figure
         '''
         (rows, cols) = np.shape(self.data)
-        prop = fm.FontProperties(fname=self.fontPath,
-                                 size='small',
-                                 #stretch='ultra-condensed'
-                                 )
 
         #---------------------------------------------------
         # reorder rows and columns?
-        if orderRows:
-            # work out linkage
-            row_dist = pdist(self.data)
-            row_linkage_matrix = linkage(row_dist)
-            row_ordering = leaves_list(row_linkage_matrix)
-        else:
-            row_ordering = np.arange(rows)
+        (row_ordering, column_ordering) = self.orderings(orderRows, orderColumns)
+
+        if showRowDendrogram and (not orderRows or self.rowLinkage is None):
+            raise ValueError("a row dendrogram needs clustered rows")
+        if showColumnDendrogram and (not orderColumns or self.columnLinkage is None):
+            raise ValueError("a column dendrogram needs clustered columns")
+
+        layout = (rows, cols, width, height, showRowDendrogram,
+                  showColumnDendrogram, self.gapPerc, self.fontPath)
+        if canvas is None:
+            canvas = HeatMapCanvas(*layout)
+        elif canvas.layout != layout:
+            raise ValueError("canvas was made for a different map layout")
+
+        # dendrograms
+        row_lines = None
+        column_lines = None
+        if showRowDendrogram:
+            row_lines = self._dendrogramLines(self.rowLinkage,
+                                              canvas.patchHeight + canvas.gap,
+                                              canvas.gap + canvas.patchHeight/2)
+        if showColumnDendrogram:
+            column_lines = self._dendrogramLines(self.columnLinkage,
+                                                 canvas.patchWidth + canvas.gap,
+                                                 canvas.gap + canvas.patchWidth/2)
+
+        canvas.update(self.cellColors(row_ordering, column_ordering),
+                      [self.rowNames[r] for r in row_ordering],
+                      [self.columnNames[c] for c in column_ordering],
+                      rowDendrogram=row_lines,
+                      columnDendrogram=column_lines)
+        return canvas.figure
 
-        if orderColumns:
-            column_dist = pdist(np.transpose(self.data))
-            column_linkage_matrix = linkage(column_dist)
-            column_ordering = leaves_list(column_linkage_matrix)
-        else:
-            column_ordering = np.arange(cols)
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+class HeatMapCanvas(object):
+    '''A heatmap figure that can be drawn over and over
+
+    The figure, axes, cell patches and label texts are made once. Each
+    HeatMap.makeMap(canvas=...) call only swaps in new colors, labels
+    and dendrogram lines, so maps of the same shape can be rendered back
+    to back without laying the figure out again
+    '''
+    def __init__(self,
+                 rows,
+                 cols,
+                 width,
+                 height,
+                 showRowDendrogram=False,
+                 showColumnDendrogram=False,
+                 gapPerc=0.02,
+                 fontPath=None):
+        '''
+        Default constructor.
+
+        Inputs:
+         rows - int, number of rows in the maps to draw
+         cols - int, number of columns in the maps to draw
+         width - float, width of the heatmap
+         height - float, height of the heatmap
+         showRowDendrogram == True -> leave room for a row dendrogram
+         showColumnDendrogram == True -> leave room for a column dendrogram
+         gapPerc - float, percent of the block width to use as a gap
+         fontPath - string, font for the labels [the bundled Menlo]
+
+        Outputs:
+         None
+        '''
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.gridspec import GridSpec
+        from matplotlib.patches import FancyBboxPatch
+        from matplotlib.collections import LineCollection, PatchCollection
+        import matplotlib.font_manager as fm
+
+        if fontPath is None:
+            from pkg_resources import resource_filename
+            fontPath = os.path.abspath(resource_filename('mikeplotlib',
+                                                         'Menlo-Regular.ttf'))
+        self.layout = (rows, cols, width, height, showRowDendrogram,
+                       showColumnDendrogram, gapPerc, fontPath)
+        prop = fm.FontProperties(fname=fontPath,
+                                 size='small',
+                                 #stretch='ultra-condensed'
+                                 )
 
-        patch_width  = float(width) / float( cols + self.gapPerc * (cols-1) )
-        gap = patch_width * self.gapPerc
-        patch_height = (float(height) - (gap * (rows-1))) / float(rows)
+        self.patchWidth  = float(width) / float( cols + gapPerc * (cols-1) )
+        gap = self.patchWidth * gapPerc
+        self.patchHeight = (float(height) - (gap * (rows-1))) / float(rows)
+        self.gap = gap
+        patch_width = self.patchWidth
+        patch_height = self.patchHeight
 
         #----------------------------------------------------
-        # plot the actual heatmap
+        # lay out the figure
         #
-        fig = plt.figure(facecolor='w')
-
-        hm_ax = fig.add_subplot(223)
-        row_desc_ax = fig.add_subplot(224)
-        col_desc_ax = fig.add_subplot(221)
+        # no pyplot here so maps can be made in several threads at once
+        self.figure = Figure(facecolor='w')
+        FigureCanvasAgg(self.figure)
 
-        col_desc_ax = plt.subplot2grid((4,5), (0,0), rowspan=1, colspan=3)
-        hm_ax = plt.subplot2grid((4,5), (1,0), rowspan=3, colspan=3)
-        row_desc_ax = plt.subplot2grid((4,5), (1,3), rowspan=3, colspan=2)
+        # make room for the dendrograms on the left and top
+        dr = 1 if showRowDendrogram else 0
+        dc = 1 if showColumnDendrogram else 0
+        # fix the spacing
+        grid = GridSpec(4+dc, 5+dr, wspace=.05, hspace=.05)
+        col_desc_ax = self.figure.add_subplot(grid[dc, dr:3+dr])
+        hm_ax = self.figure.add_subplot(grid[1+dc:4+dc, dr:3+dr])
+        row_desc_ax = self.figure.add_subplot(grid[1+dc:4+dc, 3+dr:5+dr])
 
         # how much to round the corner by
         corner = gap
 
+        # one patch per cell, row by row, all colored in a single call
+        patches = []
+        self.rowTexts = []
         top = 0
-        for r in row_ordering:
+        for r in range(rows):
             left = 0.
             # label the heatmap row
-            row_desc_ax.text(0,
-                             top+gap+patch_height/2,
-                             self.rowNames[r],
-                             verticalalignment='center',
-                             fontproperties=prop)
-
-            for c in column_ordering:
-                hm_ax.add_patch(FancyBboxPatch((left+corner, top+corner),
-                                               patch_width-2*corner,
-                                               patch_height-2*corner,
-                                               edgecolor='none',
-                                               boxstyle="round,pad=%d" % corner,
-                                               facecolor=self.SBs[c].makeColor(self.data[r][c],
-                                                                               hexFormat=True))
-                             )
-
+            self.rowTexts.append(row_desc_ax.text(0,
+                                                  top+gap+patch_height/2,
+                                                  '',
+                                                  verticalalignment='center',
+                                                  fontproperties=prop))
+
+            for c in range(cols):
+                patches.append(FancyBboxPatch((left+corner, top+corner),
+                                              patch_width-2*corner,
+                                              patch_height-2*corner,
+                                              boxstyle="round,pad=%d" % corner))
                 left += patch_width + gap
             top += (patch_height + gap)
+        self.cells = PatchCollection(patches, edgecolor='none')
+        hm_ax.add_collection(self.cells)
+
         left = 0
         # label the heatmap columns
-        for c in column_ordering:
-            col_desc_ax.text(left + gap + patch_width/2,
-                             top,
-                             self.columnNames[c],
-                             verticalalignment='bottom',
-                             horizontalalignment='center',
-                             fontproperties=prop,
-                             rotation=90)
+        self.columnTexts = []
+        for c in range(cols):
+            self.columnTexts.append(col_desc_ax.text(left + gap + patch_width/2,
+                                                     top,
+                                                     '',
+                                                     verticalalignment='bottom',
+                                                     horizontalalignment='center',
+                                                     fontproperties=prop,
+                                                     rotation=90))
             left += patch_width + gap
 
         # fix limits and set borders
@@ -194,16 +659,60 @@ class HeatMap(object):
         col_desc_ax.set_ylim(height, 0)
         col_desc_ax.set_axis_off()
 
-        # fix the spacing
-        plt.subplots_adjust(wspace=.05, hspace=.05)
-
-        fig.set_size_inches(8,10)
-        fig.savefig(fileName,dpi=300)
+        # dendrograms, lines are filled in by update
+        self.rowDendrogram = None
+        self.columnDendrogram = None
+        if showRowDendrogram:
+            self._rowDendAx = self.figure.add_subplot(grid[1+dc:4+dc, 0])
+            self.rowDendrogram = LineCollection([], colors='k', linewidths=0.5)
+            # leaves run down the y axis, root on the left
+            self._rowDendAx.add_collection(self.rowDendrogram)
+            self._rowDendAx.set_ylim(height, 0)
+            self._rowDendAx.set_axis_off()
+
+        if showColumnDendrogram:
+            self._colDendAx = self.figure.add_subplot(grid[0, dr:3+dr])
+            self.columnDendrogram = LineCollection([], colors='k', linewidths=0.5)
+            self._colDendAx.add_collection(self.columnDendrogram)
+            self._colDendAx.set_xlim(0, width)
+            self._colDendAx.set_axis_off()
+
+    def update(self,
+               colors,
+               rowLabels,
+               columnLabels,
+               rowDendrogram=None,
+               columnDendrogram=None):
+        '''swap in the contents of a new map
 
-        #plt.show()
-        plt.close(fig)
-        del fig
+        Inputs:
+         colors - array (rows x columns x 3), uint8 or 0 - 1 float RGB
+                  colors in display order
+         rowLabels - [string], row labels top to bottom
+         columnLabels - [string], column labels left to right
+         rowDendrogram - ([polyline], max_height), see
+                         HeatMap._dendrogramLines
+         columnDendrogram - ([polyline], max_height)
 
+        Outputs:
+         None
+        '''
+        colors = np.asarray(colors)
+        if colors.dtype.kind in "iu":
+            colors = colors / 255.
+        self.cells.set_facecolors(colors.reshape(-1, colors.shape[-1]))
+        for (text, label) in zip(self.rowTexts, rowLabels):
+            text.set_text(label)
+        for (text, label) in zip(self.columnTexts, columnLabels):
+            text.set_text(label)
+        if rowDendrogram is not None:
+            (lines, max_height) = rowDendrogram
+            self.rowDendrogram.set_segments([[(y, x) for (x, y) in line] for line in lines])
+            self._rowDendAx.set_xlim(max_height, 0)
+        if columnDendrogram is not None:
+            (lines, max_height) = columnDendrogram
+            self.columnDendrogram.set_segments(lines)
+            self._colDendAx.set_ylim(0, max_height)
 
 ###############################################################################
 ###############################################################################
@@ -0,0 +1,479 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+#    htmlExport.py - heatmaps as one zoomable, self contained html file       #
+#                                                                             #
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = "Michael Imelfort"
+__copyright__ = "Copyright 2014"
+__credits__ = ["Michael Imelfort"]
+__license__ = "GPL3"
+__version__ = "1.0.0"
+__maintainer__ = "Michael Imelfort"
+__email__ = "mike@mikeimelfort.com"
+__status__ = "Released"
+
+###############################################################################
+
+import base64
+import html
+import json
+import struct
+import zlib
+
+import numpy as np
+
+from mikeplotlib.colorSpace import parseColor
+from mikeplotlib.renderCache import writeTarget
+from mikeplotlib.sineBow import SineBow
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+# payload layout, all little endian:
+#  magic, version, rows, columns, palette length, metadata length (header)
+#  palette - palette length x RGB bytes
+#  metadata - utf8 json of names and color bounds
+#  cells - rows x columns palette indices, row major in display order
+_MAGIC = b"MPLH"
+_VERSION = 1
+_HEADER = struct.Struct("<4sB3xIIII")
+
+# the viewer. The payload is inflated as a stream and rows are drawn as
+# they arrive. Cells are colored into tiles only when a tile comes into
+# view and tiles are kept in a small LRU, so opening even a huge map only
+# touches about one screen of cells. Zoomed out, tiles sample every 2^n th
+# cell instead of drawing cells smaller than a pixel
+_VIEWER = r'''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>__TITLE__</title>
+<style>
+html, body { margin: 0; height: 100%; overflow: hidden; font: 12px monospace; }
+#map { display: block; width: 100%; height: 100%; cursor: crosshair; }
+#tip { position: fixed; pointer-events: none; background: #fffffe; border: 1px solid #888;
+       padding: 2px 4px; white-space: pre; display: none; }
+#status { position: fixed; right: 6px; bottom: 4px; color: #666; }
+</style>
+</head>
+<body>
+<canvas id="map"></canvas>
+<div id="tip"></div>
+<div id="status">loading...</div>
+<script id="payload" type="application/octet-stream">__PAYLOAD__</script>
+<script>
+(async function() {
+  const TILE = 256, MAX_TILES = 384, LABEL_CELL = 8, B64_CHUNK = 1 << 20;
+  const status = document.getElementById("status");
+  if (typeof DecompressionStream === "undefined") {
+    status.textContent = "this browser can not unpack the map";
+    return;
+  }
+  // feed the base64 in slices so neither it nor the inflated cells are
+  // ever handled in one piece. Yield between slices so rows can be drawn
+  const encoded = document.getElementById("payload").textContent.trim();
+  const inflater = new DecompressionStream("deflate");
+  const writer = inflater.writable.getWriter(), reader = inflater.readable.getReader();
+  (async function() {
+    try {
+      for (let i = 0; i < encoded.length; i += B64_CHUNK) {
+        const text = atob(encoded.slice(i, i + B64_CHUNK)), bytes = new Uint8Array(text.length);
+        for (let j = 0; j < text.length; j++)
+          bytes[j] = text.charCodeAt(j);
+        await writer.write(bytes);
+        await new Promise(resolve => setTimeout(resolve, 0));
+      }
+      await writer.close();
+    } catch (e) {
+      // the reader sees the same error
+    }
+  })();
+
+  let pending = new Uint8Array(0);
+  async function take(n) {
+    while (pending.length < n) {
+      const next = await reader.read();
+      if (next.done)
+        throw new Error("truncated");
+      const joined = new Uint8Array(pending.length + next.value.length);
+      joined.set(pending);
+      joined.set(next.value, pending.length);
+      pending = joined;
+    }
+    const out = pending.subarray(0, n);
+    pending = pending.subarray(n);
+    return out;
+  }
+
+  let rows, cols, palette, meta;
+  try {
+    const head = await take(24);
+    if (String.fromCharCode(head[0], head[1], head[2], head[3]) !== "MPLH" || head[4] !== 1) {
+      status.textContent = "not a mikeplotlib map";
+      return;
+    }
+    const view = new DataView(head.buffer, head.byteOffset, 24);
+    rows = view.getUint32(8, true);
+    cols = view.getUint32(12, true);
+    const paletteLength = view.getUint32(16, true), metaLength = view.getUint32(20, true);
+    const colors = await take(3 * paletteLength);
+    // RGBA packed the way ImageData lays it out on little endian machines
+    palette = new Uint32Array(paletteLength);
+    for (let i = 0, at = 0; i < paletteLength; i++, at += 3)
+      palette[i] = ((255 << 24) | (colors[at + 2] << 16) | (colors[at + 1] << 8) | colors[at]) >>> 0;
+    meta = JSON.parse(new TextDecoder().decode(await take(metaLength)));
+  } catch (e) {
+    status.textContent = "could not unpack the map";
+    return;
+  }
+
+  // rows are drawn as soon as they are unpacked
+  const cells = new Uint8Array(rows * cols);
+  let filled = 0, loadedRows = 0;
+  function store(bytes) {
+    const n = Math.min(bytes.length, cells.length - filled);
+    cells.set(bytes.subarray(0, n), filled);
+    filled += n;
+    loadedRows = cols > 0 ? Math.floor(filled / cols) : rows;
+  }
+  store(pending);
+  pending = null;
+
+  const canvas = document.getElementById("map"), ctx = canvas.getContext("2d");
+  const tip = document.getElementById("tip");
+  const longest = names => names.reduce((m, n) => Math.max(m, n.length), 0);
+  const gutterLeft = Math.min(240, 8 + 7 * longest(meta.rows));
+  const gutterTop = Math.min(240, 8 + 7 * longest(meta.columns));
+  let width = 0, height = 0, sx = 1, sy = 1, ox = 0, oy = 0, queued = 0;
+
+  const tiles = new Map();
+  function tile(tx, ty, lx, ly) {
+    const key = tx + "," + ty + "," + lx + "," + ly;
+    let t = tiles.get(key);
+    if (t) {
+      tiles.delete(key);
+      tiles.set(key, t);
+      return t;
+    }
+    const stepX = 1 << lx, stepY = 1 << ly;
+    const c0 = tx * TILE * stepX, r0 = ty * TILE * stepY;
+    const cellsW = Math.min(TILE * stepX, cols - c0), cellsH = Math.min(TILE * stepY, rows - r0);
+    const w = Math.ceil(cellsW / stepX), h = Math.ceil(cellsH / stepY);
+    // rows still being unpacked stay blank and the tile is not kept
+    const ready = Math.min(h, Math.ceil((loadedRows - r0) / stepY));
+    const image = new ImageData(w, h), pixels = new Uint32Array(image.data.buffer);
+    for (let y = 0; y < ready; y++) {
+      const src = (r0 + y * stepY) * cols + c0;
+      for (let x = 0; x < w; x++)
+        pixels[y * w + x] = palette[cells[src + x * stepX]];
+    }
+    t = document.createElement("canvas");
+    t.width = w;
+    t.height = h;
+    t.getContext("2d").putImageData(image, 0, 0);
+    t.cellsW = cellsW;
+    t.cellsH = cellsH;
+    if (ready < h)
+      return t;
+    tiles.set(key, t);
+    if (tiles.size > MAX_TILES)
+      tiles.delete(tiles.keys().next().value);
+    return t;
+  }
+
+  function draw() {
+    queued = 0;
+    ctx.setTransform(devicePixelRatio, 0, 0, devicePixelRatio, 0, 0);
+    ctx.fillStyle = "#fff";
+    ctx.fillRect(0, 0, width, height);
+    const lx = Math.max(0, Math.floor(Math.log2(1 / sx))), ly = Math.max(0, Math.floor(Math.log2(1 / sy)));
+    const spanX = TILE << lx, spanY = TILE << ly;
+    const c0 = Math.max(0, Math.floor((gutterLeft - ox) / sx)), c1 = Math.min(cols, Math.ceil((width - ox) / sx));
+    const r0 = Math.max(0, Math.floor((gutterTop - oy) / sy)), r1 = Math.min(rows, Math.ceil((height - oy) / sy));
+    ctx.save();
+    ctx.beginPath();
+    ctx.rect(gutterLeft, gutterTop, width - gutterLeft, height - gutterTop);
+    ctx.clip();
+    ctx.imageSmoothingEnabled = false;
+    for (let ty = Math.floor(r0 / spanY); ty * spanY < r1; ty++)
+      for (let tx = Math.floor(c0 / spanX); tx * spanX < c1; tx++) {
+        const t = tile(tx, ty, lx, ly);
+        ctx.drawImage(t, ox + tx * spanX * sx, oy + ty * spanY * sy, t.cellsW * sx, t.cellsH * sy);
+      }
+    ctx.restore();
+    ctx.fillStyle = "#000";
+    if (sy >= LABEL_CELL) {
+      ctx.font = Math.min(sy * 0.8, 12) + "px monospace";
+      ctx.textAlign = "right";
+      ctx.textBaseline = "middle";
+      for (let r = r0; r < r1; r++)
+        ctx.fillText(meta.rows[r], gutterLeft - 4, oy + (r + 0.5) * sy, gutterLeft - 6);
+    }
+    if (sx >= LABEL_CELL) {
+      ctx.font = Math.min(sx * 0.8, 12) + "px monospace";
+      ctx.textAlign = "left";
+      ctx.textBaseline = "middle";
+      ctx.save();
+      ctx.rotate(-Math.PI / 2);
+      for (let c = c0; c < c1; c++)
+        ctx.fillText(meta.columns[c], 4 - gutterTop, ox + (c + 0.5) * sx, gutterTop - 6);
+      ctx.restore();
+    }
+  }
+
+  function redraw() {
+    if (!queued)
+      queued = requestAnimationFrame(draw);
+  }
+
+  function fit() {
+    sx = (width - gutterLeft) / cols;
+    sy = (height - gutterTop) / rows;
+    ox = gutterLeft;
+    oy = gutterTop;
+    redraw();
+  }
+
+  function resize() {
+    width = canvas.clientWidth;
+    height = canvas.clientHeight;
+    canvas.width = width * devicePixelRatio;
+    canvas.height = height * devicePixelRatio;
+    redraw();
+  }
+
+  canvas.addEventListener("wheel", e => {
+    e.preventDefault();
+    const f = Math.exp(-e.deltaY * 0.002);
+    // shift / alt zoom one axis only
+    const fx = e.altKey ? 1 : f, fy = e.shiftKey ? 1 : f;
+    ox = e.offsetX - (e.offsetX - ox) * fx;
+    oy = e.offsetY - (e.offsetY - oy) * fy;
+    sx *= fx;
+    sy *= fy;
+    redraw();
+  }, {passive: false});
+
+  let drag = null;
+  canvas.addEventListener("mousedown", e => { drag = [e.clientX, e.clientY]; });
+  window.addEventListener("mouseup", () => { drag = null; });
+  window.addEventListener("mousemove", e => {
+    if (drag) {
+      ox += e.clientX - drag[0];
+      oy += e.clientY - drag[1];
+      drag = [e.clientX, e.clientY];
+      redraw();
+    }
+    const c = Math.floor((e.offsetX - ox) / sx), r = Math.floor((e.offsetY - oy) / sy);
+    if (e.target !== canvas || e.offsetX < gutterLeft || e.offsetY < gutterTop ||
+        c < 0 || r < 0 || c >= cols || r >= rows) {
+      tip.style.display = "none";
+      return;
+    }
+    const index = cells[r * cols + c];
+    let value = "missing";
+    if (r >= loadedRows) {
+      value = "loading";
+    } else if (index < meta.levels) {
+      const lo = meta.lowerBounds[c], hi = meta.upperBounds[c];
+      value = "~" + (lo + index / (meta.levels - 1) * (hi - lo)).toPrecision(4);
+    }
+    tip.textContent = meta.rows[r] + "\n" + meta.columns[c] + "\n" + value;
+    tip.style.left = (e.clientX + 12) + "px";
+    tip.style.top = (e.clientY + 12) + "px";
+    tip.style.display = "block";
+  });
+  canvas.addEventListener("dblclick", fit);
+  window.addEventListener("resize", resize);
+  resize();
+  fit();
+
+  try {
+    while (filled < cells.length) {
+      const next = await reader.read();
+      if (next.done)
+        break;
+      store(next.value);
+      status.textContent = loadedRows + " of " + rows + " rows";
+      redraw();
+    }
+  } catch (e) {
+    status.textContent = "could not unpack all of the map";
+    return;
+  }
+  status.textContent = filled < cells.length ? "the map is truncated" : rows + " x " + cols;
+  redraw();
+})();
+</script>
+</body>
+</html>
+'''
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+def makePalette(colorMap, levels=255, missingColor="#d9d9d9"):
+    '''build the color table for quantized heatmap values
+
+    Inputs:
+     colorMap - string, a sineBow type colormap or the name of a Cb2Cols
+                map eg. "seqBlues"
+     levels - int, number of colors for values (at most 255)
+     missingColor - #RGB string or RGB triple for missing values
+
+    Outputs:
+     uint8 array (levels + 1 x 3), the last row is the missing color
+    '''
+    if colorMap in SineBow.availableSchemes:
+        SB = SineBow(1., lowerBound=0., mapType=colorMap)
+        colors = SB.makeColorArray(np.linspace(0., 1., levels))
+    else:
+        from mikeplotlib.cbCols import getLUT
+        colors = getLUT(colorMap, levels)
+    return np.vstack([colors, np.array([parseColor(missingColor)], dtype=np.uint8)])
+
+def quantizeValues(values, lowerBounds, upperBounds, levels=255):
+    '''turn heatmap values into palette indices
+
+    Each column is scaled into its own bounds the same way colorValues
+    does it, then rounded to the nearest of levels steps
+
+    Inputs:
+     values - float array (rows x columns), may hold NaNs
+     lowerBounds - float array (columns), value of the first color
+     upperBounds - float array (columns), value of the last color
+     levels - int, number of color steps (at most 255)
+
+    Outputs:
+     uint8 array (rows x columns), missing values get index levels
+    '''
+    if not 2 <= levels <= 255:
+        raise ValueError("levels must be between 2 and 255")
+    values = np.asarray(values, dtype=np.float64)
+    lowers = np.asarray(lowerBounds, dtype=np.float64)
+    uppers = np.asarray(upperBounds, dtype=np.float64)
+    scaled = (np.clip(values, lowers, uppers) - lowers) / (uppers - lowers)
+    missing = np.isnan(scaled)
+    scaled[missing] = 0.
+    indices = np.rint(scaled * (levels - 1)).astype(np.uint8)
+    indices[missing] = levels
+    return indices
+
+def makePayload(heatMap,
+                orderRows=False,
+                orderColumns=False,
+                colorMap=None,
+                levels=255,
+                chunkRows=65536,
+                compressLevel=9):
+    '''pack an ordered heatmap into the compressed viewer payload
+
+    Rows are quantized and compressed a chunk at a time so only the
+    indices, never a float copy of the whole ordered matrix, are held
+
+    Inputs:
+     heatMap - HeatMap, the map to pack
+     orderRows == True -> order rows by hierarchical clustering
+     orderColumns == True -> order columns by hierarchical clustering
+     colorMap - string, palette to use [the heatmap's own]
+     levels - int, number of color steps (at most 255)
+     chunkRows - int, rows quantized at a time
+     compressLevel - int, 0 - 9 zlib level
+
+    Outputs:
+     bytes, zlib compressed
+    '''
+    (row_ordering, column_ordering) = heatMap.orderings(orderRows, orderColumns)
+    palette = makePalette(colorMap or heatMap.colorMap, levels, heatMap.missingColor)
+    lowers = heatMap.lowerBounds[column_ordering]
+    uppers = heatMap.upperBounds[column_ordering]
+    meta = json.dumps({"rows" : [str(heatMap.rowNames[r]) for r in row_ordering],
+                       "columns" : [str(heatMap.columnNames[c]) for c in column_ordering],
+                       "lowerBounds" : lowers.tolist(),
+                       "upperBounds" : uppers.tolist(),
+                       "levels" : levels}).encode("utf-8")
+
+    compressor = zlib.compressobj(compressLevel)
+    parts = [compressor.compress(_HEADER.pack(_MAGIC,
+                                              _VERSION,
+                                              len(row_ordering),
+                                              len(column_ordering),
+                                              len(palette),
+                                              len(meta))),
+             compressor.compress(palette.tobytes()),
+             compressor.compress(meta)]
+    values = np.asarray(heatMap.data)
+    for start in range(0, len(row_ordering), chunkRows):
+        block = values[row_ordering[start:start+chunkRows]][:,column_ordering]
+        parts.append(compressor.compress(quantizeValues(block, lowers, uppers, levels).tobytes()))
+    parts.append(compressor.flush())
+    return b"".join(parts)
+
+def exportHTML(heatMap,
+               fileName=None,
+               orderRows=False,
+               orderColumns=False,
+               colorMap=None,
+               levels=255,
+               title=None,
+               compressLevel=9):
+    '''write a heatmap as a single html page that zooms and pans
+
+    The page holds the quantized matrix (see makePayload) and a canvas
+    viewer that colors only the tiles in view, so it opens without a
+    server and stays responsive for maps of millions of cells. Wheel to
+    zoom (shift / alt for one axis), drag to pan, double click to reset
+
+    Inputs:
+     heatMap - HeatMap, the map to export
+     fileName - string or file, where to save the page. None -> return it
+     orderRows == True -> order rows by hierarchical clustering
+     orderColumns == True -> order columns by hierarchical clustering
+     colorMap - string, sineBow type colormap or Cb2Cols map name
+                [the heatmap's own]
+     levels - int, number of color steps (at most 255)
+     title - string, page title
+     compressLevel - int, 0 - 9 zlib level
+
+    Outputs:
+     bytes of the page if fileName is None, else None
+    '''
+    payload = makePayload(heatMap,
+                          orderRows=orderRows,
+                          orderColumns=orderColumns,
+                          colorMap=colorMap,
+                          levels=levels,
+                          compressLevel=compressLevel)
+    # base64 never holds the title marker, so fill the payload in first
+    page = _VIEWER.replace("__PAYLOAD__", base64.b64encode(payload).decode("ascii"))
+    page = page.replace("__TITLE__", html.escape(title or "heatmap"))
+    data = page.encode("utf-8")
+    if fileName is None:
+        return data
+    writeTarget(fileName, data)
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+#    quantileSketch.py - mergeable streaming quantile estimates               #
+#                                                                             #
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = "Michael Imelfort"
+__copyright__ = "Copyright 2014"
+__credits__ = ["Michael Imelfort"]
+__license__ = "GPL3"
+__version__ = "1.0.0"
+__maintainer__ = "Michael Imelfort"
+__email__ = "mike@mikeimelfort.com"
+__status__ = "Released"
+
+###############################################################################
+
+import numpy as np
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+class QuantileSketch(object):
+    '''Approximate quantiles for one or more columns of streamed values
+
+    This is a compactor based sketch in the spirit of KLL. Values land in
+    level 0 and whenever a level holds a full block of k values the block is
+    sorted and every second value (random offset) is promoted to the next
+    level where it counts double. Blocks are compacted in bulk so a chunk of
+    n values costs O(n log k) rather than a full sort, and memory stays at
+    O(k log(n/k)) values per column.
+
+    All columns see the same number of values so the levels are stored as
+    (m x columns) arrays and every column is compacted at once. NaNs are
+    kept in place (they sort to the top of each block) but carry no weight
+    when quantiles are worked out, so missing values are simply ignored.
+    '''
+    def __init__(self,
+                 numColumns=1,
+                 k=1024,
+                 seed=None):
+        '''
+        Default constructor.
+
+        Inputs:
+         numColumns - int, number of independent columns to track
+         k - int, compactor block size (even), bigger is more accurate
+         seed - int, seed for the random compaction offsets
+
+        Outputs:
+         None
+        '''
+        if k < 2 or k % 2 != 0:
+            raise ValueError("k must be an even number >= 2")
+        self.numColumns = int(numColumns)
+        self.k = int(k)
+        self.count = 0
+        self.levels = []
+        self._rng = np.random.RandomState(seed)
+
+    def update(self, values):
+        '''add a chunk of values to the sketch
+
+        Inputs:
+         values - array, (n x numColumns) values or a flat array if
+                  numColumns is 1. NaNs and masked entries are ignored
+
+        Outputs:
+         self
+        '''
+        if np.ma.isMaskedArray(values):
+            values = np.ma.filled(values.astype(np.float64), np.nan)
+        values = np.asarray(values, dtype=np.float64)
+        if self.numColumns == 1:
+            # nothing to keep in step with so NaNs can go straight away
+            values = values.reshape(-1, 1)
+            values = values[~np.isnan(values[:,0])]
+        elif values.ndim != 2 or values.shape[1] != self.numColumns:
+            raise ValueError("expected values with %d columns" % self.numColumns)
+        if values.shape[0] == 0:
+            return self
+        self.count += values.shape[0]
+        self._insert(0, values)
+        return self
+
+    def merge(self, other):
+        '''fold another sketch (built with the same settings) into this one
+
+        Inputs:
+         other - QuantileSketch, the sketch to merge
+
+        Outputs:
+         self
+        '''
+        if other.numColumns != self.numColumns or other.k != self.k:
+            raise ValueError("can only merge sketches with matching numColumns and k")
+        self.count += other.count
+        for level, values in enumerate(other.levels):
+            if values.shape[0] > 0:
+                self._insert(level, values)
+        return self
+
+    def _insert(self, level, values):
+        '''add weighted values at a level and compact upwards
+
+        Inputs:
+         level - int, level the values belong to (weight 2**level)
+         values - array, (n x numColumns) values
+
+        Outputs:
+         None
+        '''
+        k = self.k
+        half = k // 2
+        carry = values
+        while carry is not None:
+            if level == len(self.levels):
+                self.levels.append(np.empty((0, self.numColumns)))
+            if self.levels[level].shape[0] > 0:
+                buf = np.concatenate((self.levels[level], carry))
+            else:
+                buf = carry
+            num_blocks = buf.shape[0] // k
+            if num_blocks == 0:
+                self.levels[level] = buf
+                carry = None
+            else:
+                full = num_blocks * k
+                self.levels[level] = np.array(buf[full:])
+                blocks = buf[:full].reshape(num_blocks, k, self.numColumns)
+                blocks = np.sort(blocks, axis=1)
+                # keep the odd or even ranked values of each block
+                offsets = self._rng.randint(0, 2, size=(num_blocks, 1, self.numColumns))
+                keep = np.arange(half).reshape(1, half, 1) * 2 + offsets
+                carry = np.take_along_axis(blocks, keep, axis=1).reshape(-1, self.numColumns)
+                level += 1
+
+    def _weighted(self):
+        '''gather the retained values and their weights
+
+        Outputs:
+         (values, weights) - (m x numColumns) array, (m) array
+        '''
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(lvl.shape[0], 2.**i)
+                                  for (i, lvl) in enumerate(self.levels)])
+        return (values, weights)
+
+    def quantile(self, q):
+        '''estimate quantiles for every column
+
+        Values are interpolated between neighbouring retained samples, so
+        while nothing has been compacted away this matches np.percentile
+        (linear method)
+
+        Inputs:
+         q - float or [float], quantile(s) in [0, 1]
+
+        Outputs:
+         array of shape (numColumns) for a scalar q or (len(q) x numColumns).
+         Columns with no values other than NaN give NaN
+        '''
+        if self.count == 0 or len(self.levels) == 0:
+            raise ValueError("cannot compute quantiles of an empty sketch")
+        qs = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        (values, weights) = self._weighted()
+        weights = np.where(np.isnan(values), 0., weights.reshape(-1, 1))
+        # NaNs sort to the end of each column
+        order = np.argsort(values, axis=0)
+        sorted_values = np.take_along_axis(values, order, axis=0)
+        sorted_weights = np.take_along_axis(weights, order, axis=0)
+        cum_weights = np.cumsum(sorted_weights, axis=0)
+        valid = ~np.isnan(sorted_values)
+        columns = np.arange(self.numColumns)
+        last = np.maximum(valid.sum(axis=0) - 1, 0)
+        # place each retained value in [0, 1] so the first sits at 0 and the
+        # last at 1. With equal weights this is np.percentile's linear rule
+        span = cum_weights[-1] - sorted_weights[last, columns]
+        positions = np.zeros_like(sorted_values)
+        np.divide(cum_weights - sorted_weights, span, out=positions, where=valid & (span > 0))
+        ret = np.empty((len(qs), self.numColumns))
+        for (i, qq) in enumerate(qs):
+            # interpolate between the retained values either side of qq
+            above = np.sum(valid & (positions <= qq), axis=0)
+            lo = np.clip(above - 1, 0, last)
+            hi = np.minimum(above, last)
+            (p_lo, p_hi) = (positions[lo, columns], positions[hi, columns])
+            gap = p_hi - p_lo
+            frac = np.zeros(self.numColumns)
+            np.divide(qq - p_lo, gap, out=frac, where=gap > 0)
+            (v_lo, v_hi) = (sorted_values[lo, columns], sorted_values[hi, columns])
+            ret[i] = v_lo + frac * (v_hi - v_lo)
+        if np.ndim(q) == 0:
+            return ret[0]
+        return ret
+
+    def percentileBounds(self, lower, upper):
+        '''get clipped percentile bounds for every column
+
+        Inputs:
+         lower - float, lower percentile (0 - 100)
+         upper - float, upper percentile (0 - 100)
+
+        Outputs:
+         (lowerBounds, upperBounds) - arrays of length numColumns
+        '''
+        bounds = self.quantile([lower / 100., upper / 100.])
+        return (bounds[0], bounds[1])
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+#    renderCache.py - content addressed on disk cache of rendered figures     #
+#                                                                             #
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = "Michael Imelfort"
+__copyright__ = "Copyright 2014"
+__credits__ = ["Michael Imelfort"]
+__license__ = "GPL3"
+__version__ = "1.0.0"
+__maintainer__ = "Michael Imelfort"
+__email__ = "mike@mikeimelfort.com"
+__status__ = "Released"
+
+###############################################################################
+
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+# bump this when a change to the drawing code changes what gets rendered
+RENDER_VERSION = 1
+
+# a full sweep of the cache directory (ages, sizes, orphaned temp files)
+# runs every this many puts, or straight away once the cache looks too big
+SWEEP_EVERY = 256
+
+# a full cache is trimmed to this fraction of maxBytes so the next few
+# writes do not each need a sweep
+_LOW_WATER = 0.9
+
+# seconds after which a temp file must be left over from an interrupted write
+_STALE_TMP = 3600.
+
+def imageFormat(target, default="png"):
+    '''work out the image format to save to
+
+    Inputs:
+     target - string or file, where the image will go
+     default - string, format to use if it can not be worked out
+
+    Outputs:
+     a format name eg. "png"
+    '''
+    name = target if isinstance(target, str) else getattr(target, "name", None)
+    if isinstance(name, str):
+        ext = os.path.splitext(name)[1].lower().lstrip(".")
+        if ext != "":
+            return ext
+    return default
+
+def writeTarget(target, data):
+    '''write encoded image bytes to a path or a file like object
+
+    Inputs:
+     target - string or file, where the image goes
+     data - bytes, the encoded image
+
+    Outputs:
+     None
+    '''
+    if isinstance(target, str):
+        with open(target, "wb") as fh:
+            fh.write(data)
+    else:
+        target.write(data)
+
+def _feed(hasher, value):
+    '''add a value to a hash in a type aware way
+
+    Inputs:
+     hasher - hashlib object
+     value - array, list, tuple, dict, string, number, type, dtype or None
+
+    Outputs:
+     None
+    '''
+    if isinstance(value, np.dtype) or \
+       isinstance(value, type) and (issubclass(value, np.generic) or value in (bool, int, float, complex)):
+        # dtype=np.float32 and friends. Type objects have __array__ too so
+        # this has to come before the array branch
+        hasher.update(("dtype:%s;" % np.dtype(value).str).encode())
+    elif isinstance(value, type):
+        hasher.update(("type:%s.%s;" % (value.__module__, value.__qualname__)).encode())
+    elif isinstance(value, (np.ndarray, np.generic)) or hasattr(value, "__array__") and \
+         not isinstance(value, (str, bytes)):
+        array = np.ascontiguousarray(value)
+        if array.dtype.kind == "O":
+            if array.ndim == 0:
+                # tolist() would hand back the same object
+                hasher.update(("object:%r;" % array.item()).encode())
+            else:
+                _feed(hasher, array.tolist())
+            return
+        hasher.update(("array:%s:%s:" % (array.dtype.str, array.shape)).encode())
+        hasher.update(memoryview(array.reshape(-1)).cast("B"))
+    elif isinstance(value, (list, tuple)):
+        hasher.update(("seq:%d:" % len(value)).encode())
+        for item in value:
+            _feed(hasher, item)
+    elif isinstance(value, dict):
+        hasher.update(("dict:%d:" % len(value)).encode())
+        for key in sorted(value, key=str):
+            _feed(hasher, str(key))
+            _feed(hasher, value[key])
+    elif isinstance(value, bytes):
+        hasher.update(b"bytes:" + value)
+    else:
+        hasher.update(("%s:%r;" % (type(value).__name__, value)).encode())
+
+def makeKey(*parts):
+    '''hash everything that affects a rendered image into a cache key
+
+    Inputs:
+     parts - arrays, labels, settings etc. Arrays are hashed by dtype,
+             shape and contents
+
+    Outputs:
+     hex digest string
+    '''
+    hasher = hashlib.blake2b(digest_size=20)
+    _feed(hasher, RENDER_VERSION)
+    for part in parts:
+        _feed(hasher, part)
+    return hasher.hexdigest()
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+class RenderCache(object):
+    '''Encoded images on disk, keyed by a hash of everything that went in
+
+    Entries not used for maxAge are dropped and, once the cache is bigger
+    than maxBytes, the least recently used entries go first. Reading an
+    entry marks it as used. The size is tracked as entries are written so
+    the directory is only walked when it is over budget or every
+    SWEEP_EVERY writes, and other processes sharing the directory are
+    caught up with then
+    '''
+    def __init__(self,
+                 directory,
+                 maxBytes=1 << 30,
+                 maxAge=None):
+        '''
+        Default constructor.
+
+        Inputs:
+         directory - string, where to keep the cached images
+         maxBytes - int, size to evict down to
+         maxAge - float, seconds an entry may go unused before it is
+                  dropped (None for forever)
+
+        Outputs:
+         None
+        '''
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.maxAge = maxAge
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # running total of cached bytes, None until the first sweep
+        self._bytes = None
+        self._puts = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        '''file holding a key, spread over sub directories'''
+        return os.path.join(self.directory, key[:2], key + ".img")
+
+    def _entries(self, suffixes=".img"):
+        '''every cached (or temp) file as (path, size, last_used)'''
+        entries = []
+        for (root, dirs, files) in os.walk(self.directory):
+            for name in files:
+                if name.endswith(suffixes):
+                    path = os.path.join(root, name)
+                    try:
+                        info = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((path, info.st_size, info.st_mtime))
+        return entries
+
+    def _expired(self, lastUsed, now):
+        '''check if an entry has gone unused for too long'''
+        return self.maxAge is not None and now - lastUsed > self.maxAge
+
+    def get(self, key):
+        '''get a cached image
+
+        Inputs:
+         key - string, see makeKey
+
+        Outputs:
+         bytes or None if the key is not cached
+        '''
+        path = self._path(key)
+        try:
+            if self._expired(os.path.getmtime(path), time.time()):
+                os.remove(path)
+                raise OSError(path)
+            with open(path, "rb") as fh:
+                data = fh.read()
+            # mark as recently used
+            os.utime(path, None)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        '''store an image and evict old entries if the cache is too big
+
+        Inputs:
+         key - string, see makeKey
+         data - bytes, the encoded image
+
+        Outputs:
+         None
+        '''
+        path = self._path(key)
+        shard = os.path.dirname(path)
+        os.makedirs(shard, exist_ok=True)
+        # write then rename so readers never see half an image
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        (handle, tmp_path) = tempfile.mkstemp(dir=shard, suffix=".tmp")
+        with os.fdopen(handle, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._puts += 1
+            if self._bytes is not None:
+                self._bytes += len(data) - replaced
+            sweep = self._bytes is None or self._bytes > self.maxBytes or \
+                    self._puts % SWEEP_EVERY == 0
+        if sweep:
+            self.evict()
+
+    def evict(self):
+        '''drop expired entries and then, if the cache is bigger than
+        maxBytes, the least recently used ones until it is back under
+        90% of it. Temp files left by interrupted
+        writes go too
+
+        Outputs:
+         number of entries removed
+        '''
+        now = time.time()
+        entries = []
+        for (path, size, used) in self._entries((".img", ".tmp")):
+            if not path.endswith(".tmp"):
+                entries.append((path, size, used))
+            elif now - used > _STALE_TMP:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        total = sum(size for (path, size, used) in entries)
+        budget = self.maxBytes if total <= self.maxBytes else self.maxBytes * _LOW_WATER
+        removed = 0
+        for (path, size, used) in sorted(entries, key=lambda entry: entry[2]):
+            if not self._expired(used, now) and total <= budget:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self.evictions += removed
+            self._bytes = total
+        return removed
+
+    def clear(self):
+        '''remove every cached image
+
+        Outputs:
+         None
+        '''
+        for (path, size, used) in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._bytes = 0
+
+    def stats(self):
+        '''hit / miss counts for this object and the size of the cache
+
+        Outputs:
+         dict of hits, misses, hitRate, evictions, entries and bytes
+        '''
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {"hits" : self.hits,
+                "misses" : self.misses,
+                "hitRate" : float(self.hits) / lookups if lookups > 0 else 0.,
+                "evictions" : self.evictions,
+                "entries" : len(entries),
+                "bytes" : sum(size for (path, size, used) in entries)}
+
+    def render(self, key, target, draw, format=None):
+        '''serve an image from the cache or draw and cache it
+
+        Inputs:
+         key - string, see makeKey (the image format is added to it)
+         target - string or file, where the image goes
+         draw - callable(target, format) that saves the image
+         format - string, image format (default from the target name)
+
+        Outputs:
+         True if the image came from the cache
+        '''
+        fmt = format if format is not None else imageFormat(target)
+        key = makeKey(key, fmt)
+        data = self.get(key)
+        if data is not None:
+            writeTarget(target, data)
+            return True
+        buf = io.BytesIO()
+        draw(buf, fmt)
+        data = buf.getvalue()
+        self.put(key, data)
+        writeTarget(target, data)
+        return False
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+#    sharedData.py - hand big arrays to worker processes without copying      #
+#                                                                             #
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = "Michael Imelfort"
+__copyright__ = "Copyright 2014"
+__credits__ = ["Michael Imelfort"]
+__license__ = "GPL3"
+__version__ = "1.0.0"
+__maintainer__ = "Michael Imelfort"
+__email__ = "mike@mikeimelfort.com"
+__status__ = "Released"
+
+###############################################################################
+
+import mmap
+import os
+import sys
+import tempfile
+import uuid
+import weakref
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+# everything a worker needs to find an array. Small and picklable
+#  kind - "shm" (multiprocessing.shared_memory), "memmap" (.npy file) or
+#         "file" (read only view of a raw memory mapped file)
+#  name - segment name or file path
+#  offset - bytes before the array starts in a "file"
+SharedArrayHandle = namedtuple('SharedArrayHandle',
+                               ['kind', 'name', 'shape', 'dtype', 'offset'],
+                               defaults=(0,))
+
+BACKINGS = ["shm", "memmap"]
+
+class _Mapping(object):
+    '''keep a shared memory segment mapped for as long as any array uses it
+
+    Arrays made from this object (and every view of them) hold it as their
+    base, so the segment is closed once the last of them is gone
+    '''
+    def __init__(self, shm, shape, dtype):
+        self._shm = shm
+        self.name = shm.name
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        # point numpy straight at the mapping. Going through the buffer
+        # protocol would leave an export that stops the segment closing
+        probe = np.frombuffer(shm.buf, dtype=np.uint8, count=1)
+        address = probe.ctypes.data
+        del probe
+        self.__array_interface__ = {"shape" : tuple(shape),
+                                    "typestr" : dtype.str,
+                                    "descr" : dtype.descr,
+                                    "data" : (address, False),
+                                    "version" : 3}
+
+    def __del__(self):
+        self._shm.close()
+
+def _openSegment(name):
+    '''attach to an existing segment without the resource tracker
+    claiming it (python >= 3.13, older ones share the parent's tracker)'''
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+def attachArray(handle):
+    '''get the array behind a handle, without copying it
+
+    Inputs:
+     handle - SharedArrayHandle, from SharedArray.handle
+
+    Outputs:
+     numpy array backed by the shared segment or file
+    '''
+    dtype = np.lib.format.descr_to_dtype(handle.dtype)
+    if handle.kind == "shm":
+        return np.asarray(_Mapping(_openSegment(handle.name), handle.shape, dtype))
+    if handle.kind == "memmap":
+        return np.load(handle.name, mmap_mode="r+")
+    if handle.kind == "file":
+        return np.memmap(handle.name, dtype=dtype, mode="r", offset=handle.offset,
+                         shape=tuple(handle.shape))
+    raise ValueError("unknown shared array kind: %s" % handle.kind)
+
+def findHandle(data):
+    '''get a handle for data that already lives in shared memory or in a
+    file, so workers can read it in place
+
+    Inputs:
+     data - SharedArray, SharedArrayHandle, an array attached from one,
+            or a whole memory mapped file (np.memmap, np.load(mmap_mode=))
+
+    Outputs:
+     a SharedArrayHandle, or None if data is in ordinary memory (or is
+     only part of a mapping)
+    '''
+    if isinstance(data, SharedArray):
+        return data.handle
+    if isinstance(data, SharedArrayHandle):
+        return data
+    if not isinstance(data, np.ndarray) or not data.flags.c_contiguous:
+        return None
+    base = data.base
+    if isinstance(base, _Mapping) and data.shape == base.shape and data.dtype == base.dtype:
+        return SharedArrayHandle("shm",
+                                 base.name,
+                                 data.shape,
+                                 np.lib.format.dtype_to_descr(data.dtype))
+    # views of a memmap have the memmap, not the mmap, as their base
+    if isinstance(data, np.memmap) and isinstance(base, mmap.mmap) and data.filename is not None:
+        return SharedArrayHandle("file",
+                                 data.filename,
+                                 data.shape,
+                                 np.lib.format.dtype_to_descr(data.dtype),
+                                 data.offset)
+    return None
+
+def resolveArray(data):
+    '''turn shared arrays and handles into plain arrays, leave anything
+    else alone
+
+    Inputs:
+     data - SharedArray, SharedArrayHandle or anything else
+
+    Outputs:
+     an array, or data unchanged
+    '''
+    if isinstance(data, SharedArray):
+        return data.array
+    if isinstance(data, SharedArrayHandle):
+        return attachArray(data)
+    return data
+
+def _release(kind, name):
+    '''remove a segment or file once its owner is done with it'''
+    try:
+        if kind == "shm":
+            segment = shared_memory.SharedMemory(name=name)
+            segment.unlink()
+            segment.close()
+        else:
+            os.remove(name)
+    except (OSError, FileNotFoundError):
+        pass
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+class SharedArray(object):
+    '''An array in shared memory (or a memory mapped file) that worker
+    processes attach to by name instead of receiving a pickled copy
+
+    The object that makes the array owns it: close() (or leaving a with
+    block, or the owner being garbage collected) removes the segment.
+    Mappings already open, in this process or in workers, stay valid
+    until their arrays are gone. Pickling a SharedArray only sends its
+    handle and unpickles as the attached numpy array, so it can be passed
+    straight to Pool.map, ProcessPoolExecutor.submit, etc.
+    '''
+    def __init__(self,
+                 shape,
+                 dtype=np.float64,
+                 backing="shm",
+                 directory=None):
+        '''
+        Default constructor. The array starts zeroed
+
+        Inputs:
+         shape - (int, ...), shape of the array
+         dtype - numpy type of the array
+         backing - string, where the array lives ["shm", "memmap"]
+         directory - string, where memmap files go [system temp dir]
+
+        Outputs:
+         None
+        '''
+        if backing not in BACKINGS:
+            raise ValueError("unknown backing: %s" % backing)
+        dtype = np.dtype(dtype)
+        shape = tuple(int(s) for s in np.atleast_1d(shape))
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        if backing == "shm":
+            segment = shared_memory.SharedMemory(create=True, size=max(1, nbytes))
+            name = segment.name
+            self.array = np.asarray(_Mapping(segment, shape, dtype))
+        else:
+            name = os.path.join(directory or tempfile.gettempdir(),
+                                "mikeplotlib-%s.npy" % uuid.uuid4().hex)
+            self.array = np.lib.format.open_memmap(name, mode="w+", dtype=dtype, shape=shape)
+        self.handle = SharedArrayHandle(backing,
+                                        name,
+                                        shape,
+                                        np.lib.format.dtype_to_descr(dtype))
+        self._finalizer = weakref.finalize(self, _release, backing, name)
+
+    @classmethod
+    def fromArray(cls, array, backing="shm", directory=None):
+        '''copy an array into a new shared array
+
+        Inputs:
+         array - array like, data to share
+         backing, directory - see __init__
+
+        Outputs:
+         a SharedArray
+        '''
+        array = np.asarray(array)
+        shared = cls(array.shape, array.dtype, backing=backing, directory=directory)
+        shared.array[...] = array
+        return shared
+
+    @property
+    def closed(self):
+        return not self._finalizer.alive
+
+    def close(self):
+        '''remove the shared segment or file
+
+        Outputs:
+         None
+        '''
+        if isinstance(self.array, np.memmap):
+            self.array.flush()
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __array__(self, dtype=None, copy=None):
+        # copy=None copies only if the dtype changes, False never copies
+        if dtype is None or np.dtype(dtype) == self.array.dtype:
+            if copy:
+                return self.array.copy()
+            return self.array
+        if copy is False:
+            raise ValueError("can not convert shared %s data to %s without a copy"
+                             % (self.array.dtype, np.dtype(dtype)))
+        return self.array.astype(dtype, copy=True)
+
+    def __reduce__(self):
+        # workers get the array itself, attached by name
+        return (attachArray, (self.handle,))
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
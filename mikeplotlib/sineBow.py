@@ -79,6 +79,7 @@ class SineBow(object):
         (self.thetaMin, self.thetaMax) = self.schemes[mapType]
         self.thetaSpan = self.thetaMax - self.thetaMin
 
+        self.mode = mode
         if mode == "bright":
             self.maker = self.makeBrightColor
         else:
@@ -87,12 +88,20 @@ class SineBow(object):
     def _findTheta(self, value):
         '''find the angle corresponding to the given value
 
+        Values outside the bounds are clamped so they get the end colors
+
         Input:
-         value - float, the value to produce a color for
+         value - float or array of floats, the value to produce a color for
 
         Outputs:
          an angle
         '''
+        low = min(self.lowerBound, self.upperBound)
+        high = max(self.lowerBound, self.upperBound)
+        if hasattr(value, "clip"):
+            value = value.clip(low, high)
+        else:
+            value = min(max(value, low), high)
         return ((value - self.lowerBound)/self.boundSpan * self.thetaSpan) +\
                     self.thetaMin
 
@@ -126,6 +135,44 @@ class SineBow(object):
         else:
             return (r,g,b)
 
+    def makeColorArray(self, values, missingColor="#d9d9d9"):
+        '''make colors for a whole array of values at once
+
+        Gives exactly the same colors as calling makeColor on each value,
+        including values outside the bounds, which both clamp to the end
+        colors. NaNs and masked entries get missingColor
+
+        Inputs:
+         values - array or masked array of floats
+         missingColor - #RGB string or RGB triple for missing values
+
+        Outputs:
+         uint8 array (values.shape + (3,)) of RGB values
+        '''
+        # numpy is only needed here, keep it out of the import
+        import numpy as np
+        from mikeplotlib.colorSpace import parseColor, splitMissing
+
+        (values, missing) = splitMissing(values, fill=self.lowerBound)
+        theta = self._findTheta(values)
+        rgb = np.zeros(theta.shape + (3,), dtype=np.float64)
+        if self.mode == "bright":
+            shape = lambda x: x
+        else:
+            shape = np.square
+        rgb[...,0] = np.where(theta > math.pi,
+                              shape(np.cos(theta+math.pi/2.)),
+                              np.where(theta < math.pi/2, shape(np.cos(theta)), 0.))
+        rgb[...,1] = np.where((theta > math.pi/2.) & (theta < 3.*math.pi/2.),
+                              shape(np.cos(theta)) * (-1. if self.mode == "bright" else 1.),
+                              0.)
+        rgb[...,2] = np.where(theta < math.pi, shape(np.sin(theta)), 0.)
+        # int() truncates so do the same here
+        colors = np.trunc(255. * rgb).astype(np.uint8)
+        if np.any(missing):
+            colors[missing] = parseColor(missingColor)
+        return colors
+
     def makeBrightColor(self, value):
         '''return a bright color
 
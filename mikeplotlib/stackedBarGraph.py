@@ -31,10 +31,11 @@ __status__ = "Released"
 
 ###############################################################################
 
+import warnings
+
 import numpy as np
-np.seterr(all='raise')
 
-from matplotlib import pyplot as plt
+# matplotlib is slow to import so it is only pulled in when drawing
 
 ###############################################################################
 ###############################################################################
@@ -45,6 +46,7 @@ class StackedBarGrapher:
     """Container class"""
     def __init__(self): pass
 
+    @np.errstate(all='raise')
     def stackedBarPlot(self,
                        ax,
                        data,
@@ -59,13 +61,21 @@ class StackedBarGrapher:
                        ylabel='',
                        xlabel='',
                        gap=0.,
-                       endGaps=False
+                       endGaps=False,
+                       useCollection=False,
+                       dtype=np.float64,
+                       binBars=None,
+                       binMode="sum",
+                       levelNames=None
                        ):
         '''make a stacked bar graph
 
         Inputs:
-         ax - pyplot axes, axes to plot onto
-         data - float matrix, data to plot (bars x levels)
+         ax - matplotlib axes, axes to plot onto. Only this axes is
+              touched so figures can be drawn in several threads at once
+         data - float matrix, data to plot (bars x levels). A pandas
+                DataFrame or a numpy structured / record array works too,
+                its index / field names fill in xLabels and levelNames
          cols - [string], #RGB colors for each level
          xLabels - [string], bar specific labels
          yTicks - variable, information used for making y ticks
@@ -80,6 +90,17 @@ class StackedBarGrapher:
          xlabel - string, label for x axis
          gap - float, gap between bars
          endGaps == True -> allow gaps at end of bar chart (only if gaps != 0.)
+         useCollection == True -> draw every segment of every bar as one
+                                  PolyCollection instead of one Rectangle
+                                  per segment (much faster for big plots)
+         dtype - numpy float type used for the stacking math
+                 (np.float32 halves the memory used for big plots)
+         binBars - variable, merge adjacent bars into groups so no more
+                   than this many are drawn [None, "auto" or <int>]
+                   "auto" uses one group per horizontal pixel of ax
+         binMode - string, how to combine the levels of merged bars
+                   ["sum", "mean"]
+         levelNames - [string], level specific labels, used by ax.legend()
 
         Outputs:
          None
@@ -88,74 +109,47 @@ class StackedBarGrapher:
 # data fixeratering
 
         # make sure this makes sense
+        (data, xLabels, levelNames) = self._unpackData(data, xLabels, levelNames)
         if showFirst != -1:
             showFirst = np.min([showFirst, np.shape(data)[0]])
-            data_copy = np.copy(data[:showFirst]).transpose().astype('float')
-            data_shape = np.shape(data_copy)
+            data = data[:showFirst]
             if heights is not None:
                 heights = heights[:showFirst]
             if widths is not None:
                 widths = widths[:showFirst]
             showFirst = -1
-        else:
-            data_copy = np.copy(data).transpose()
-        data_shape = np.shape(data_copy)
+
+        # squash bars that would be narrower than a pixel
+        if binBars is not None:
+            if binBars == "auto":
+                binBars = int(ax.get_window_extent().width)
+            (data, widths, heights, xLabels) = self._binBars(data,
+                                                             widths,
+                                                             heights,
+                                                             xLabels,
+                                                             binBars,
+                                                             binMode,
+                                                             dtype)
 
         # determine the number of bars / corresponding levels from data shape
-        num_bars = data_shape[1]
-        levels = data_shape[0]
+        (num_bars, levels) = np.shape(data)
 
         if widths is None:
-            widths = np.array([1] * num_bars)
+            widths = np.ones(num_bars)
             x = np.arange(num_bars)
         else:
-            x = [0]
-            for i in range(1, len(widths)):
-                x.append(x[i-1] + (widths[i-1] + widths[i])/2)
+            # each bar sits half its width past the end of the last one
+            widths = np.asarray(widths, dtype=np.float64)
+            x = np.zeros(num_bars)
+            np.cumsum((widths[:-1] + widths[1:]) / 2., out=x[1:])
 
-        # stack the data --
-        # replace the value in each level by the cum sum of all preceding levels
-        data_stack = np.reshape([float(i) for \
-                                 i in np.ravel(np.cumsum(data_copy,
-                                                         axis=0))],
-                                data_shape)
-
-        # scale the data is needed
-        if scale:
-            data_copy /= data_stack[levels-1]
-            data_stack /= data_stack[levels-1]
-            if heights is not None:
-                print "WARNING: setting scale and heights does not make sense."
-                heights = None
-        elif heights is not None:
-            data_copy /= data_stack[levels-1]
-            data_stack /= data_stack[levels-1]
-            for i in np.arange(num_bars):
-                data_copy[:,i] *= heights[i]
-                data_stack[:,i] *= heights[i]
+        data_stack = self._stackData(data, scale, heights, dtype)
 
 #------------------------------------------------------------------------------
 # ticks
-        if yTicks is not "none":
-            # it is either a set of ticks or the number of auto ticks to make
-            real_ticks = True
-            try:
-                k = len(yTicks[1])
-            except:
-                real_ticks = False
-
-            if not real_ticks:
-                yTicks = float(yTicks)
-                if scale:
-                    # make the ticks line up to 100 %
-                    y_ticks_at = np.arange(yTicks)/(yTicks-1)
-                    y_tick_labels = \
-                        np.array(["%0.2f"%(i * 100) for i in y_ticks_at])
-                else:
-                    # space the ticks along the y axis
-                    y_ticks_at = np.arange(yTicks)/(yTicks-1)*np.max(data_stack)
-                    y_tick_labels = np.array([str(i) for i in y_ticks_at])
-                yTicks=(y_ticks_at, y_tick_labels)
+        show_y_ticks = not (isinstance(yTicks, str) and yTicks == "none")
+        if show_y_ticks:
+            yTicks = self._makeYTicks(yTicks, scale, np.max(data_stack))
 
 #------------------------------------------------------------------------------
 # plot
@@ -163,29 +157,50 @@ class StackedBarGrapher:
             edgeCols = ["none"]*len(cols)
 
         # take care of gaps
-        gapd_widths = [i - gap for i in widths]
+        gapd_widths = widths - gap
 
         # bars
-        ax.bar(x,
-               data_stack[0],
-               color=cols[0],
-               edgecolor=edgeCols[0],
-               width=gapd_widths,
-               linewidth=0.5,
-               align='center'
-               )
-
-        for i in np.arange(1,levels):
+        if useCollection and levelNames is None:
+            ax.add_collection(self._makeCollection(x,
+                                                   gapd_widths,
+                                                   data_stack,
+                                                   cols,
+                                                   edgeCols))
+        elif useCollection:
+            from matplotlib.collections import PolyCollection
+            # one collection per level so each gets a legend entry
+            verts = self._makeVerts(x, gapd_widths, data_stack).reshape(levels, num_bars, 4, 2)
+            for i in np.arange(levels):
+                ax.add_collection(PolyCollection(verts[i],
+                                                 facecolors=cols[i],
+                                                 edgecolors=edgeCols[i],
+                                                 linewidths=0.5,
+                                                 label=levelNames[i]))
+        else:
+            if levelNames is None:
+                levelNames = [None]*levels
             ax.bar(x,
-                   data_copy[i],
-                   bottom=data_stack[i-1],
-                   color=cols[i],
-                   edgecolor=edgeCols[i],
+                   data_stack[0],
+                   color=cols[0],
+                   edgecolor=edgeCols[0],
                    width=gapd_widths,
                    linewidth=0.5,
-                   align='center'
+                   align='center',
+                   label=levelNames[0]
                    )
 
+            for i in np.arange(1,levels):
+                ax.bar(x,
+                       data_stack[i] - data_stack[i-1],
+                       bottom=data_stack[i-1],
+                       color=cols[i],
+                       edgecolor=edgeCols[i],
+                       width=gapd_widths,
+                       linewidth=0.5,
+                       align='center',
+                       label=levelNames[i]
+                       )
+
         # borders
         ax.spines["top"].set_visible(False)
         ax.spines["right"].set_visible(False)
@@ -193,15 +208,16 @@ class StackedBarGrapher:
         ax.spines["left"].set_visible(False)
 
         # make ticks if necessary
-        if yTicks is not "none":
+        if show_y_ticks:
             ax.tick_params(axis='y',
                            which='both',
                            labelsize=8,
                            direction="out")
             ax.yaxis.tick_left()
-            plt.yticks(yTicks[0], yTicks[1])
+            ax.set_yticks(yTicks[0])
+            ax.set_yticklabels(yTicks[1])
         else:
-            plt.yticks([], [])
+            ax.set_yticks([])
 
         if xLabels is not None:
             ax.tick_params(axis='x',
@@ -209,9 +225,10 @@ class StackedBarGrapher:
                            labelsize=8,
                            direction="out")
             ax.xaxis.tick_bottom()
-            plt.xticks(x, xLabels, rotation='vertical')
+            ax.set_xticks(x)
+            ax.set_xticklabels(xLabels, rotation='vertical')
         else:
-            plt.xticks([], [])
+            ax.set_xticks([])
 
         # limits
         if endGaps:
@@ -225,9 +242,447 @@ class StackedBarGrapher:
 
         # labels
         if xlabel != '':
-            plt.xlabel(xlabel)
+            ax.set_xlabel(xlabel)
         if ylabel != '':
-            plt.ylabel(ylabel)
+            ax.set_ylabel(ylabel)
+
+    def savePlot(self,
+                 fileName,
+                 data,
+                 cols,
+                 figSize=(8,6),
+                 dpi=300,
+                 title=None,
+                 legend=False,
+                 format=None,
+                 cache=None,
+                 **kwargs):
+        '''draw a stacked bar graph on its own figure and save it
+
+        Inputs:
+         fileName - string or file, where to save the graph
+         data - float matrix, data to plot (bars x levels)
+         cols - [string], #RGB colors for each level
+         figSize - (float, float), figure size in inches
+         dpi - int, resolution of the saved image
+         title - string, title for the graph
+         legend == True -> add a legend of the level names
+         format - string, image format eg. "png" (default from fileName)
+         cache - RenderCache, serve repeated graphs from here instead of
+                 drawing them again
+         kwargs - any other stackedBarPlot arguments
+
+        Outputs:
+         None
+        '''
+        def draw(target, fmt=None):
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+            fig = Figure(figsize=figSize, facecolor='w')
+            FigureCanvasAgg(fig)
+            ax = fig.add_subplot(111)
+            self.stackedBarPlot(ax, data, cols, **kwargs)
+            if title is not None:
+                ax.set_title(title)
+            if legend:
+                ax.legend(fontsize=8, loc='upper left', bbox_to_anchor=(1., 1.))
+            fig.tight_layout()
+            fig.savefig(target, dpi=dpi, format=fmt)
+            del fig
+
+        if cache is None:
+            draw(fileName, format)
+            return
+        # hash the plain matrix so DataFrames etc. key the same as arrays
+        (values, x_labels, level_names) = self._unpackData(data,
+                                                           kwargs.get("xLabels"),
+                                                           kwargs.get("levelNames"))
+        options = dict(kwargs)
+        options["xLabels"] = x_labels
+        options["levelNames"] = level_names
+        if "dtype" in options:
+            # "float32", np.float32 and np.dtype("float32") draw the same
+            options["dtype"] = np.dtype(options["dtype"])
+        from mikeplotlib.renderCache import makeKey
+        key = makeKey("bars", values, cols, figSize, dpi, title, legend, options)
+        cache.render(key, fileName, draw, format=format)
+
+    @np.errstate(all='raise')
+    def facetPlot(self,
+                  fig,
+                  data,
+                  cols,
+                  numCols=None,
+                  panelNames=None,
+                  xLabels=None,
+                  levelNames=None,
+                  yTicks=6.,
+                  edgeCols=None,
+                  scale=False,
+                  gap=0.,
+                  sharey=True,
+                  legend=False,
+                  dtype=np.float64):
+        '''draw a grid of small stacked bar graphs, one per panel
+
+        Every panel is stacked in one pass over the whole array and drawn
+        as a single PolyCollection. Axes, ticks and the color table are
+        shared by all panels
+
+        Inputs:
+         fig - matplotlib Figure, figure to draw into
+         data - float array, data to plot (panels x bars x levels)
+         cols - [string], #RGB colors for each level
+         numCols - int, panels per row of the grid [about square]
+         panelNames - [string], title for each panel
+         xLabels - [string], bar specific labels (bottom row only)
+         levelNames - [string], level specific labels, used for the legend
+         yTicks - variable, see stackedBarPlot
+         edgeCols - [string], #RGB colors for edges
+         scale == True --> scale bars to same height
+         gap - float, gap between bars
+         sharey == True -> one y scale for every panel, else each panel
+                           gets its own limits
+         legend == True -> add one figure legend of the level names
+         dtype - numpy float type used for the stacking math
+
+        Outputs:
+         [matplotlib axes], one per panel
+        '''
+        from matplotlib.collections import PolyCollection
+        from matplotlib.colors import to_rgba_array
+        from matplotlib.gridspec import GridSpec
+
+        data = np.asarray(data)
+        if data.ndim != 3:
+            raise ValueError("data must be (panels x bars x levels)")
+        (num_panels, num_bars, levels) = data.shape
+        if numCols is None:
+            numCols = int(np.ceil(np.sqrt(num_panels)))
+        num_rows = int(np.ceil(num_panels / float(numCols)))
+
+        # stack every panel at once: (panels x levels x bars)
+        data_stack = np.empty((num_panels, levels, num_bars), dtype=dtype)
+        np.cumsum(np.transpose(data, (0, 2, 1)), axis=1, out=data_stack)
+        if scale:
+            data_stack /= data_stack[:,levels-1:levels,:].copy()
+
+        x = np.arange(num_bars)
+        verts = self._makeVerts(x, np.ones(num_bars) - gap, data_stack)
+
+        # one color table for every panel
+        if edgeCols is None:
+            edgeCols = ["none"]*len(cols)
+        face_colors = np.repeat(to_rgba_array(cols[:levels]), num_bars, axis=0)
+        edge_colors = np.repeat(to_rgba_array(edgeCols[:levels]), num_bars, axis=0)
+
+        show_y_ticks = not (isinstance(yTicks, str) and yTicks == "none")
+        panel_tops = data_stack[:,levels-1,:].max(axis=1)
+        if sharey:
+            tops = np.repeat(panel_tops.max(), num_panels)
+        else:
+            tops = panel_tops
+
+        grid = GridSpec(num_rows, numCols, hspace=0.3, wspace=0.1 if sharey else 0.4)
+        axes = []
+        for p in range(num_panels):
+            (row, col) = divmod(p, numCols)
+            share = axes[0] if len(axes) > 0 else None
+            ax = fig.add_subplot(grid[row, col],
+                                 sharex=share,
+                                 sharey=share if sharey else None)
+            ax.add_collection(PolyCollection(verts[p],
+                                             facecolors=face_colors,
+                                             edgecolors=edge_colors,
+                                             linewidths=0.5))
+            for spine in ax.spines.values():
+                spine.set_visible(False)
+            if panelNames is not None:
+                # set_title measures every axis to place itself, plain text
+                # at a fixed spot is much cheaper across many panels
+                ax.text(0.5, 1.02, panelNames[p],
+                        transform=ax.transAxes,
+                        ha='center',
+                        va='bottom',
+                        fontsize=8)
+            if not sharey or p == 0:
+                # shared axes pick these up from the first panel
+                if show_y_ticks:
+                    ticks = self._makeYTicks(yTicks, scale, tops[p])
+                    ax.set_yticks(ticks[0])
+                    ax.set_yticklabels(ticks[1])
+                    ax.set_ylim(0, ticks[0][-1])
+                else:
+                    ax.set_yticks([])
+                    ax.set_ylim(0, 1. if scale else tops[p])
+            if p == 0:
+                if xLabels is not None:
+                    ax.set_xticks(x)
+                    ax.set_xticklabels(xLabels)
+                else:
+                    ax.set_xticks([])
+                ax.set_xlim(-0.5 + gap/2., num_bars - 0.5 - gap/2.)
+            ax.tick_params(axis='both',
+                           which='both',
+                           labelsize=6,
+                           direction="out",
+                           labelleft=col == 0 or not sharey,
+                           labelbottom=p + numCols >= num_panels)
+            ax.tick_params(axis='x', labelrotation=90)
+            axes.append(ax)
+
+        if legend and levelNames is not None:
+            from matplotlib.patches import Patch
+            fig.legend([Patch(facecolor=cols[i], edgecolor=edgeCols[i]) for i in range(levels)],
+                       levelNames,
+                       fontsize=8,
+                       loc='upper right')
+        return axes
+
+    def saveFacetPlot(self,
+                      fileName,
+                      data,
+                      cols,
+                      figSize=None,
+                      dpi=150,
+                      format=None,
+                      title=None,
+                      **kwargs):
+        '''draw a grid of small stacked bar graphs and save it
+
+        Inputs:
+         fileName - string or file, where to save the graph
+         data - float array, data to plot (panels x bars x levels)
+         cols - [string], #RGB colors for each level
+         figSize - (float, float), figure size in inches [2 per panel]
+         dpi - int, resolution of the saved image
+         format - string, image format eg. "png" (default from fileName)
+         title - string, title for the whole figure
+         kwargs - any other facetPlot arguments
+
+        Outputs:
+         None
+        '''
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        num_panels = np.shape(data)[0]
+        num_cols = kwargs.get("numCols") or int(np.ceil(np.sqrt(num_panels)))
+        if figSize is None:
+            figSize = (2. * num_cols, 2. * np.ceil(num_panels / float(num_cols)))
+        fig = Figure(figsize=figSize, facecolor='w')
+        FigureCanvasAgg(fig)
+        self.facetPlot(fig, data, cols, **kwargs)
+        if title is not None:
+            fig.suptitle(title)
+        fig.savefig(fileName, dpi=dpi, format=format)
+        del fig
+
+    def _unpackData(self, data, xLabels=None, levelNames=None):
+        '''get a plain (bars x levels) array out of the data
+
+        DataFrames and structured arrays are read without copying where
+        their memory layout allows. Labels given explicitly win over the
+        ones taken from the data
+
+        Inputs:
+         data - float matrix, DataFrame or structured array (bars x levels)
+         xLabels - [string], bar specific labels
+         levelNames - [string], level specific labels
+
+        Outputs:
+         (data, xLabels, levelNames)
+        '''
+        if hasattr(data, "columns") and hasattr(data, "index"):
+            # pandas DataFrame, duck typed so pandas stays optional
+            if xLabels is None:
+                xLabels = [str(i) for i in data.index]
+            if levelNames is None:
+                levelNames = [str(c) for c in data.columns]
+            if hasattr(data, "to_numpy"):
+                data = data.to_numpy(copy=False)
+            else:
+                data = data.values
+        else:
+            data = np.asarray(data)
+            if data.dtype.names is not None:
+                if levelNames is None:
+                    levelNames = list(data.dtype.names)
+                from numpy.lib.recfunctions import structured_to_unstructured
+                data = structured_to_unstructured(data)
+        return (data, xLabels, levelNames)
+
+    def _binBars(self,
+                 data,
+                 widths,
+                 heights,
+                 xLabels,
+                 numBins,
+                 binMode="sum",
+                 dtype=np.float64):
+        '''merge runs of adjacent bars into at most numBins groups
+
+        Bars are grouped by where they start along the x axis so every
+        group covers the same span. Merged bars are as wide as the bars
+        they replace, their heights are the width weighted mean of the
+        original heights and they take the label of their first bar
+
+        Inputs:
+         data - float matrix, data to plot (bars x levels)
+         widths - [float], widths for each bar
+         heights - [float], heights for each bar
+         xLabels - [string], bar specific labels
+         numBins - int, maximum number of bars to keep
+         binMode - string, how to combine levels ["sum", "mean"]
+         dtype - numpy float type of the merged data
+
+        Outputs:
+         (data, widths, heights, xLabels) for the merged bars
+        '''
+        if binMode not in ["sum", "mean"]:
+            raise ValueError("unknown binMode: %s" % binMode)
+        num_bars = np.shape(data)[0]
+        numBins = max(int(numBins), 1)
+        if num_bars <= numBins:
+            return (data, widths, heights, xLabels)
+
+        if widths is None:
+            bar_widths = np.ones(num_bars)
+        else:
+            bar_widths = np.asarray(widths, dtype=np.float64)
+        lefts = np.cumsum(bar_widths) - bar_widths
+        groups = np.minimum((lefts / np.sum(bar_widths) * numBins).astype(np.intp),
+                            numBins - 1)
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+
+        binned = np.add.reduceat(data, starts, axis=0, dtype=dtype)
+        if binMode == "mean":
+            counts = np.diff(np.r_[starts, num_bars])
+            binned /= counts[:,np.newaxis]
+
+        binned_widths = np.add.reduceat(bar_widths, starts)
+        if heights is not None:
+            heights = np.add.reduceat(np.asarray(heights, dtype=np.float64) * bar_widths,
+                                      starts) / binned_widths
+        if xLabels is not None:
+            xLabels = [xLabels[i] for i in starts]
+        return (binned, binned_widths, heights, xLabels)
+
+    def _stackData(self, data, scale, heights, dtype=np.float64):
+        '''stack the data, replacing each level by the cum sum of all
+        preceding levels, and apply any scaling
+
+        Everything is written into one preallocated (levels x bars) array
+
+        Inputs:
+         data - float matrix, data to plot (bars x levels)
+         scale == True --> scale bars to same height
+         heights - [float], heights for each bar
+         dtype - numpy float type of the stacked array
+
+        Outputs:
+         float matrix, stacked data (levels x bars)
+        '''
+        (num_bars, levels) = np.shape(data)
+        data_stack = np.empty((levels, num_bars), dtype=dtype)
+        np.cumsum(np.transpose(data), axis=0, out=data_stack)
+
+        # scale the data is needed
+        if scale:
+            if heights is not None:
+                warnings.warn("setting scale and heights does not make sense, ignoring heights")
+                heights = None
+            # one multiply pass, dividing every cell is several times slower
+            data_stack *= 1. / data_stack[levels-1]
+        elif heights is not None:
+            data_stack *= np.asarray(heights, dtype=dtype) / data_stack[levels-1]
+        return data_stack
+
+    def _makeYTicks(self, yTicks, scale, maxHeight):
+        '''work out y tick positions and labels
+
+        Inputs:
+         yTicks - <int> or [[tick_pos1, ...], [tick_label_1, ...]], see
+                  stackedBarPlot
+         scale == True --> bars are scaled to the same height
+         maxHeight - float, top of the tallest bar
+
+        Outputs:
+         (tick positions, tick labels)
+        '''
+        # it is either a set of ticks or the number of auto ticks to make
+        real_ticks = True
+        try:
+            k = len(yTicks[1])
+        except:
+            real_ticks = False
+
+        if real_ticks:
+            return yTicks
+        yTicks = float(yTicks)
+        if scale:
+            # make the ticks line up to 100 %
+            y_ticks_at = np.arange(yTicks)/(yTicks-1)
+            y_tick_labels = \
+                np.array(["%0.2f"%(i * 100) for i in y_ticks_at])
+        else:
+            # space the ticks along the y axis
+            y_ticks_at = np.arange(yTicks)/(yTicks-1)*maxHeight
+            y_tick_labels = np.array([str(i) for i in y_ticks_at])
+        return (y_ticks_at, y_tick_labels)
+
+    def _makeVerts(self, x, widths, data_stack):
+        '''work out the corners of every bar segment
+
+        Inputs:
+         x - [float], bar centers
+         widths - [float], (gapped) bar widths
+         data_stack - float matrix, stacked data (levels x bars), or
+                      (... x levels x bars) for several plots at once
+
+        Outputs:
+         float array (... x levels*bars x 4 x 2), segment corners ordered
+         by level
+        '''
+        (levels, num_bars) = np.shape(data_stack)[-2:]
+        lead = np.shape(data_stack)[:-2]
+        x = np.asarray(x, dtype=np.float64)
+        half_widths = np.asarray(widths, dtype=np.float64) / 2.
+        verts = np.empty(lead + (levels, num_bars, 4, 2))
+        verts[...,0,0] = verts[...,1,0] = x - half_widths
+        verts[...,2,0] = verts[...,3,0] = x + half_widths
+        verts[...,0,:,0,1] = verts[...,0,:,3,1] = 0.
+        verts[...,1:,:,0,1] = verts[...,1:,:,3,1] = data_stack[...,:-1,:]
+        verts[...,1,1] = verts[...,2,1] = data_stack
+        return verts.reshape(lead + (levels*num_bars, 4, 2))
+
+    def _makeCollection(self, x, widths, data_stack, cols, edgeCols):
+        '''make a single PolyCollection that draws all the bar segments
+
+        Segments are drawn level by level so the result looks the same as
+        stacking with ax.bar
+
+        Inputs:
+         x - [float], bar centers
+         widths - [float], (gapped) bar widths
+         data_stack - float matrix, stacked data (levels x bars)
+         cols - [string], #RGB colors for each level
+         edgeCols - [string], #RGB colors for edges
+
+        Outputs:
+         a PolyCollection
+        '''
+        from matplotlib.collections import PolyCollection
+        from matplotlib.colors import to_rgba_array
+
+        (levels, num_bars) = np.shape(data_stack)
+        face_colors = np.repeat(to_rgba_array(cols[:levels]), num_bars, axis=0)
+        edge_colors = np.repeat(to_rgba_array(edgeCols[:levels]), num_bars, axis=0)
+        return PolyCollection(self._makeVerts(x, widths, data_stack),
+                              facecolors=face_colors,
+                              edgecolors=edge_colors,
+                              linewidths=0.5)
 
     def demo(self):
         '''Make a selection of stacked bar graphs to demonstrate the module
@@ -238,6 +693,8 @@ class StackedBarGrapher:
         Output:
          None
         '''
+        from matplotlib import pyplot as plt
+
         # some test data
         d = np.array([[101.,0.,0.,0.,0.,0.,0.],
                       [92.,3.,0.,4.,5.,6.,0.],
@@ -275,7 +732,7 @@ class StackedBarGrapher:
                             edgeCols=['#000000']*7,
                             xLabels=d_labels,
                             )
-        plt.title("Straight up stacked bars")
+        ax1.set_title("Straight up stacked bars")
 
         ax2 = fig.add_subplot(322)
         self.stackedBarPlot(ax2,
@@ -285,7 +742,7 @@ class StackedBarGrapher:
                             xLabels=d_labels,
                             scale=True
                             )
-        plt.title("Scaled bars")
+        ax2.set_title("Scaled bars")
 
         ax3 = fig.add_subplot(323)
         self.stackedBarPlot(ax3,
@@ -296,7 +753,7 @@ class StackedBarGrapher:
                             heights=d_heights,
                             yTicks=7,
                             )
-        plt.title("Bars with set heights")
+        ax3.set_title("Bars with set heights")
 
         ax4 = fig.add_subplot(324)
         self.stackedBarPlot(ax4,
@@ -308,7 +765,7 @@ class StackedBarGrapher:
                             widths=d_widths,
                             scale=True
                             )
-        plt.title("Scaled bars with set widths")
+        ax4.set_title("Scaled bars with set widths")
 
         ax5 = fig.add_subplot(325)
         self.stackedBarPlot(ax5,
@@ -318,7 +775,7 @@ class StackedBarGrapher:
                             xLabels=d_labels,
                             gap=gap
                             )
-        plt.title("Straight up stacked bars + gaps")
+        ax5.set_title("Straight up stacked bars + gaps")
 
         ax6 = fig.add_subplot(326)
         self.stackedBarPlot(ax6,
@@ -330,7 +787,7 @@ class StackedBarGrapher:
                             gap=gap,
                             endGaps=True
                             )
-        plt.title("Scaled bars + gaps + end gaps")
+        ax6.set_title("Scaled bars + gaps + end gaps")
 
         # We change the fontsize of minor ticks label
         fig.subplots_adjust(bottom=0.4)
@@ -345,6 +802,274 @@ class StackedBarGrapher:
 ###############################################################################
 ###############################################################################
 
+class LiveStackedBarGrapher(object):
+    '''Stacked bar graph that grows one bar at a time
+
+    Each bar is its own small PolyCollection. The newest bar is animated
+    so it can be redrawn over a saved background (blitting) without
+    touching the rest of the plot. Axis limits grow geometrically (and the
+    y limit shrinks again once the bars fall well below it) so the full
+    redraws they trigger are rare. Tick labels are not blitted, so a new
+    or changed label also means a full redraw. Every full redraw folds
+    the finished bars back into a single collection.
+    '''
+    def __init__(self,
+                 ax,
+                 cols,
+                 edgeCols=None,
+                 scale=False,
+                 width=1.,
+                 gap=0.,
+                 blit=True,
+                 capacity=16,
+                 growth=2.):
+        '''
+        Default constructor.
+
+        Inputs:
+         ax - matplotlib axes, axes to plot onto
+         cols - [string], #RGB colors for each level
+         edgeCols - [string], #RGB colors for edges
+         scale == True --> scale bars to same height
+         width - float, width of each bar
+         gap - float, gap between bars
+         blit == True -> redraw only the newest bar when the canvas allows
+         capacity - int, number of bars to make room for up front
+         growth - float, factor to grow the limits by when they run out
+
+        Outputs:
+         None
+        '''
+        from matplotlib.colors import to_rgba_array
+
+        self.ax = ax
+        self.levels = len(cols)
+        self.faceColors = to_rgba_array(cols)
+        if edgeCols is None:
+            edgeCols = ["none"]*len(cols)
+        self.edgeColors = to_rgba_array(edgeCols[:self.levels])
+        self.scale = scale
+        self.width = float(width)
+        self.gap = float(gap)
+        self.blit = blit
+        self.growth = float(growth)
+
+        self.numBars = 0
+        self.xLabels = []
+        self.maxHeight = 0.             # top of the tallest bar right now
+        self._finishedTop = 0.          # top of the tallest finished bar
+        self._verts = []                # segment corners of every bar
+        self._history = None            # one collection of older bars
+        self._recent = []               # finished bars not yet in _history
+        self._latest = None             # the animated newest bar
+        self._background = None
+
+        # borders
+        for spine in ["top", "right", "bottom", "left"]:
+            ax.spines[spine].set_visible(False)
+        ax.tick_params(axis='both',
+                       which='both',
+                       labelsize=8,
+                       direction="out")
+        ax.set_xticks([])
+        ax.set_xlim(-self.width/2., (capacity - 0.5) * self.width)
+        ax.set_ylim(0, 1.)
+
+    def _makeVerts(self, index, values):
+        '''work out the corners of the segments of one bar
+
+        Inputs:
+         index - int, position of the bar
+         values - [float], value for each level
+
+        Outputs:
+         float array (levels x 4 x 2)
+        '''
+        stack = np.cumsum(np.asarray(values, dtype=np.float64))
+        if self.scale:
+            stack /= stack[-1]
+        x = index * self.width
+        half_width = (self.width - self.gap) / 2.
+        verts = np.empty((self.levels, 4, 2))
+        verts[:,0,0] = verts[:,1,0] = x - half_width
+        verts[:,2,0] = verts[:,3,0] = x + half_width
+        verts[0,0,1] = verts[0,3,1] = 0.
+        verts[1:,0,1] = verts[1:,3,1] = stack[:-1]
+        verts[:,1,1] = verts[:,2,1] = stack
+        return verts
+
+    def _makeCollection(self, verts, numBars):
+        '''make a collection for some bars
+
+        Inputs:
+         verts - float array (numBars*levels x 4 x 2), segment corners
+         numBars - int, number of bars in verts
+
+        Outputs:
+         a PolyCollection
+        '''
+        from matplotlib.collections import PolyCollection
+        return PolyCollection(verts,
+                              facecolors=np.tile(self.faceColors, (numBars, 1)),
+                              edgecolors=np.tile(self.edgeColors, (numBars, 1)),
+                              linewidths=0.5)
+
+    def _canBlit(self):
+        '''work out if the newest bar can be blitted
+
+        Outputs:
+         True if blitting is on, the canvas supports it and there is a
+         saved background to draw over
+        '''
+        canvas = self.ax.figure.canvas
+        return self.blit and \
+               getattr(canvas, "supports_blit", False) and \
+               self._background is not None
+
+    def _fitLimits(self, verts):
+        '''fit the axis limits to the bars, growing the x limit and
+        following the tallest bar with the y limit
+
+        Inputs:
+         verts - float array (levels x 4 x 2), the newest bar
+
+        Outputs:
+         True if the limits changed
+        '''
+        changed = False
+        (x_min, x_max) = self.ax.get_xlim()
+        right = np.max(verts[:,:,0])
+        if right > x_max:
+            x_max = x_min + (x_max - x_min) * self.growth
+            while right > x_max:
+                x_max = x_min + (x_max - x_min) * self.growth
+            self.ax.set_xlim(x_min, x_max)
+            changed = True
+        # the newest bar can shrink, so work from the current bars
+        top = max(self._finishedTop, np.max(verts[:,:,1]))
+        self.maxHeight = top
+        y_max = self.ax.get_ylim()[1]
+        # leave headroom when growing and only shrink once the bars are
+        # a whole growth step below where they were
+        if top > y_max or 0. < top * self.growth * self.growth < y_max:
+            self.ax.set_ylim(0, top * self.growth)
+            changed = True
+        return changed
+
+    @np.errstate(all='raise')
+    def append(self, values, label=None):
+        '''add a bar to the end of the graph
+
+        Inputs:
+         values - [float], value for each level
+         label - string, label for the bar
+
+        Outputs:
+         None
+        '''
+        canvas = self.ax.figure.canvas
+        if self._latest is not None:
+            # the old newest bar becomes part of the background
+            self._latest.set_animated(False)
+            self._recent.append(self._latest)
+            self._finishedTop = max(self._finishedTop, np.max(self._verts[-1][:,:,1]))
+            if self._canBlit():
+                canvas.restore_region(self._background)
+                self.ax.draw_artist(self._latest)
+                self._background = canvas.copy_from_bbox(self.ax.bbox)
+
+        verts = self._makeVerts(self.numBars, values)
+        self._verts.append(verts)
+        self.xLabels.append(label)
+        self.numBars += 1
+
+        self._latest = self._makeCollection(verts, 1)
+        self._latest.set_animated(self.blit)
+        self.ax.add_collection(self._latest, autolim=False)
+
+        # once there are labels every new bar adds a tick label
+        relabel = any(name is not None for name in self.xLabels)
+        if self._fitLimits(verts) or relabel or not self._canBlit():
+            self.redraw()
+        else:
+            self._drawLatest()
+
+    @np.errstate(all='raise')
+    def updateLast(self, values, label=None):
+        '''replace the values of the newest bar
+
+        Inputs:
+         values - [float], value for each level
+         label - string, new label for the bar (None keeps the old one)
+
+        Outputs:
+         None
+        '''
+        if self._latest is None:
+            raise ValueError("no bars to update, call append first")
+        verts = self._makeVerts(self.numBars - 1, values)
+        self._verts[-1] = verts
+        relabel = label is not None and label != self.xLabels[-1]
+        if relabel:
+            self.xLabels[-1] = label
+        self._latest.set_verts(verts)
+
+        if self._fitLimits(verts) or relabel or not self._canBlit():
+            self.redraw()
+        else:
+            self.ax.figure.canvas.restore_region(self._background)
+            self._drawLatest()
+
+    def _drawLatest(self):
+        '''draw the newest bar over the saved background and blit it
+
+        Outputs:
+         None
+        '''
+        canvas = self.ax.figure.canvas
+        self.ax.draw_artist(self._latest)
+        canvas.blit(self.ax.bbox)
+
+    def redraw(self):
+        '''redraw everything and save a fresh background for blitting
+
+        Finished bars are folded into one collection and the tick labels
+        are brought up to date
+
+        Outputs:
+         None
+        '''
+        canvas = self.ax.figure.canvas
+        if len(self._recent) > 0:
+            for coll in self._recent:
+                coll.remove()
+            if self._history is not None:
+                self._history.remove()
+            num_finished = self.numBars - 1
+            self._history = self._makeCollection(np.concatenate(self._verts[:num_finished]),
+                                                 num_finished)
+            self.ax.add_collection(self._history, autolim=False)
+            self._recent = []
+
+        if any(label is not None for label in self.xLabels):
+            self.ax.xaxis.tick_bottom()
+            self.ax.set_xticks(np.arange(self.numBars) * self.width)
+            self.ax.set_xticklabels(["" if label is None else label for label in self.xLabels],
+                                    rotation='vertical')
+
+        if self.blit and getattr(canvas, "supports_blit", False):
+            canvas.draw()
+            self._background = canvas.copy_from_bbox(self.ax.bbox)
+            if self._latest is not None:
+                self._drawLatest()
+        else:
+            canvas.draw_idle()
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
 if __name__ == '__main__':
 
     SBG = StackedBarGrapher()
@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+#    tiledMap.py - render one huge heatmap as a raster, tile by tile          #
+#                                                                             #
+###############################################################################
+#                                                                             #
+#    This program is free software: you can redistribute it and/or modify     #
+#    it under the terms of the GNU General Public License as published by     #
+#    the Free Software Foundation, either version 3 of the License, or        #
+#    (at your option) any later version.                                      #
+#                                                                             #
+#    This program is distributed in the hope that it will be useful,          #
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+#    GNU General Public License for more details.                             #
+#                                                                             #
+#    You should have received a copy of the GNU General Public License        #
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.     #
+#                                                                             #
+###############################################################################
+
+__author__ = "Michael Imelfort"
+__copyright__ = "Copyright 2014"
+__credits__ = ["Michael Imelfort"]
+__license__ = "GPL3"
+__version__ = "1.0.0"
+__maintainer__ = "Michael Imelfort"
+__email__ = "mike@mikeimelfort.com"
+__status__ = "Released"
+
+###############################################################################
+
+import json
+import multiprocessing
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from mikeplotlib.heatMap import colorValues
+from mikeplotlib.sharedData import SharedArray, attachArray, findHandle
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+# Agg can not draw anything taller or wider than this
+_MAX_PANEL_PIXELS = 1 << 16
+
+_ADLER_BASE = 65521
+
+def _adlerCombine(adler1, adler2, len2):
+    '''adler32 of two byte strings joined, from the adler32 of each
+
+    Same as zlib's adler32_combine, which python does not expose
+
+    Inputs:
+     adler1 - int, adler32 of the first string
+     adler2 - int, adler32 of the second string
+     len2 - int, length of the second string
+
+    Outputs:
+     int adler32 of both
+    '''
+    rem = len2 % _ADLER_BASE
+    sum1 = adler1 & 0xffff
+    sum2 = (rem * sum1) % _ADLER_BASE
+    sum1 += (adler2 & 0xffff) + _ADLER_BASE - 1
+    sum2 += ((adler1 >> 16) & 0xffff) + ((adler2 >> 16) & 0xffff) + _ADLER_BASE - rem
+    if sum1 >= _ADLER_BASE:
+        sum1 -= _ADLER_BASE
+    if sum1 >= _ADLER_BASE:
+        sum1 -= _ADLER_BASE
+    if sum2 >= (_ADLER_BASE << 1):
+        sum2 -= (_ADLER_BASE << 1)
+    if sum2 >= _ADLER_BASE:
+        sum2 -= _ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+def _pngChunk(kind, data):
+    '''one length + type + data + crc block of a png file'''
+    return struct.pack(">I", len(data)) + kind + data + \
+        struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xffffffff)
+
+def _pngHeader(width, height):
+    '''png signature and IHDR for an 8 bit RGB image'''
+    return b"\x89PNG\r\n\x1a\n" + \
+        _pngChunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+def _scanlines(rgb):
+    '''png scanlines (no filter) for an RGB image'''
+    (height, width) = rgb.shape[:2]
+    lines = np.zeros((height, 1 + width * 3), dtype=np.uint8)
+    # write through a view of the scanlines so a strided block is read in
+    # place rather than copied by reshape first
+    lines[:,1:].reshape(height, width, 3)[...] = rgb
+    return lines.tobytes()
+
+def encodePNG(rgb, compressLevel=6):
+    '''encode an RGB image as png
+
+    Inputs:
+     rgb - uint8 array (height x width x 3)
+     compressLevel - int, 0 - 9 zlib level
+
+    Outputs:
+     bytes
+    '''
+    (height, width) = rgb.shape[:2]
+    return _pngHeader(width, height) + \
+        _pngChunk(b"IDAT", zlib.compress(_scanlines(rgb), compressLevel)) + \
+        _pngChunk(b"IEND", b"")
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+# set in each worker by _initWorker so tasks stay small
+_JOB = None
+
+def _initWorker(job):
+    '''attach to the shared matrix once per worker'''
+    global _JOB
+    _JOB = dict(job)
+    _JOB["data"] = attachArray(job["data"])
+
+def _colorBlock(rowStart, rowEnd, colStart, colEnd):
+    '''color part of the ordered matrix and blow cells up to pixels'''
+    columns = _JOB["columnOrdering"][colStart:colEnd]
+    rows = _JOB["rowOrdering"][rowStart:rowEnd]
+    rgb = colorValues(_JOB["data"][rows][:,columns],
+                      _JOB["lowerBounds"][columns],
+                      _JOB["upperBounds"][columns],
+                      _JOB["colorMap"],
+                      _JOB["missingColor"])
+    (cell_width, cell_height) = _JOB["cellSize"]
+    if cell_height > 1:
+        rgb = np.repeat(rgb, cell_height, axis=0)
+    if cell_width > 1:
+        rgb = np.repeat(rgb, cell_width, axis=1)
+    return rgb
+
+def _bandTask(band):
+    '''color a band of rows and deflate it as part of one png stream
+
+    The band ends on a sync flush so the bands can simply be joined
+
+    Outputs:
+     (compressed bytes, adler32 of the raw bytes, raw length)
+    '''
+    (row_start, row_end) = band
+    raw = _scanlines(_colorBlock(row_start, row_end, 0, len(_JOB["columnOrdering"])))
+    compressor = zlib.compressobj(_JOB["compressLevel"], zlib.DEFLATED, -15)
+    data = compressor.compress(raw) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return (data, zlib.adler32(raw), len(raw))
+
+def _tileTask(tile):
+    '''color one tile and write it as its own png
+
+    Outputs:
+     the file written
+    '''
+    (ty, tx, row_start, row_end, col_start, col_end) = tile
+    file_name = os.path.join(_JOB["directory"], "%d" % ty, "%d.png" % tx)
+    with open(file_name, "wb") as fh:
+        fh.write(encodePNG(_colorBlock(row_start, row_end, col_start, col_end),
+                           _JOB["compressLevel"]))
+    return file_name
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+def _runJob(heatMap, orderRows, orderColumns, cellSize, compressLevel, workers, func, tasks, extra=None):
+    '''share the matrix, farm tasks out to a pool and yield results in order
+
+    Matrices already in a SharedArray or a memory mapped file are handed
+    to the workers by name. Anything else is copied into shared memory
+    once, in its own dtype
+    '''
+    (row_ordering, column_ordering) = heatMap.orderings(orderRows, orderColumns)
+    handle = findHandle(heatMap.data)
+    shared = None
+    if handle is None:
+        shared = SharedArray.fromArray(np.asarray(heatMap.data))
+        handle = shared.handle
+    try:
+        job = {"data" : handle,
+               "rowOrdering" : row_ordering,
+               "columnOrdering" : column_ordering,
+               "lowerBounds" : heatMap.lowerBounds,
+               "upperBounds" : heatMap.upperBounds,
+               "colorMap" : heatMap.colorMap,
+               "missingColor" : heatMap.missingColor,
+               "cellSize" : tuple(int(c) for c in cellSize),
+               "compressLevel" : compressLevel}
+        job.update(extra or {})
+        pool = multiprocessing.Pool(processes=workers or multiprocessing.cpu_count(),
+                                    initializer=_initWorker,
+                                    initargs=(job,))
+        try:
+            for result in pool.imap(func, tasks):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        if shared is not None:
+            shared.close()
+
+def drawLabelPanel(names, cellPixels, fileName, axis="rows", fontPath=None, dpi=100):
+    '''draw the labels for one side of a raster heatmap
+
+    Inputs:
+     names - [string], labels in display order
+     cellPixels - int, pixels per cell along the labelled side
+     fileName - string or file, where to save the panel
+     axis - string, "rows" labels run down the side, "columns" along the
+            top ["rows", "columns"]
+     fontPath - string, font to use [the bundled Menlo]
+     dpi - int, resolution of the panel
+
+    Outputs:
+     None
+    '''
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    import matplotlib.font_manager as fm
+
+    length = len(names) * cellPixels
+    if length >= _MAX_PANEL_PIXELS:
+        raise ValueError("a %d pixel label panel is too big to draw, use a tile set" % length)
+    if fontPath is None:
+        from pkg_resources import resource_filename
+        fontPath = resource_filename('mikeplotlib', 'Menlo-Regular.ttf')
+    # text about as tall as a cell, monospaced so the width is easy to guess
+    font_pixels = cellPixels * 0.8
+    depth = int(max(len(name) for name in names) * font_pixels * 0.65) + 4
+    (width, height) = (depth, length) if axis == "rows" else (length, depth)
+    fig = Figure(figsize=(width / float(dpi), height / float(dpi)), dpi=dpi, facecolor='w')
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_axis_off()
+    prop = fm.FontProperties(fname=fontPath, size=font_pixels * 72. / dpi)
+    positions = np.arange(len(names)) + 0.5
+    if axis == "rows":
+        ax.set_xlim(0, 1)
+        ax.set_ylim(len(names), 0)
+        for (y, name) in zip(positions, names):
+            ax.text(0.01, y, name, verticalalignment='center', fontproperties=prop)
+    else:
+        ax.set_xlim(0, len(names))
+        ax.set_ylim(0, 1)
+        for (x, name) in zip(positions, names):
+            ax.text(x, 0.01, name, rotation=90, horizontalalignment='center',
+                    verticalalignment='bottom', fontproperties=prop)
+    fig.savefig(fileName, dpi=dpi)
+
+def renderRaster(heatMap,
+                 fileName,
+                 cellSize=(1, 1),
+                 orderRows=False,
+                 orderColumns=False,
+                 bandRows=None,
+                 workers=None,
+                 compressLevel=6,
+                 labels=True,
+                 minLabelPixels=6):
+    '''render a heatmap as one png, one pixel block per cell, in parallel
+
+    The ordered matrix is cut into bands of rows. Workers color each band
+    and deflate it, and the bands are written to the png as they come back,
+    so neither the image nor its encoding ever has to fit on one core
+
+    Inputs:
+     heatMap - HeatMap, the map to draw. Workers read data held in a
+               SharedArray or a memory mapped file in place, other data
+               is copied into shared memory once first
+     fileName - string, png file to write
+     cellSize - (int, int), pixels per cell (width, height)
+     orderRows == True -> order rows by hierarchical clustering
+     orderColumns == True -> order columns by hierarchical clustering
+     bandRows - int, matrix rows per worker task [about 4M pixels]
+     workers - int, worker processes [all cores]
+     compressLevel - int, 0 - 9 zlib level
+     labels == True -> also draw <fileName>.rows.png / .columns.png
+                       label panels when cells are big enough to read
+     minLabelPixels - int, smallest cell size worth labelling
+
+    Outputs:
+     [string] files written
+    '''
+    (rows, cols) = np.shape(heatMap.data)
+    (cell_width, cell_height) = cellSize
+    if bandRows is None:
+        bandRows = max(1, (1 << 22) // max(1, cols * cell_width * cell_height))
+    bands = [(r, min(r + bandRows, rows)) for r in range(0, rows, bandRows)]
+
+    with open(fileName, "wb") as fh:
+        fh.write(_pngHeader(cols * cell_width, rows * cell_height))
+        # zlib header, then the raw deflate bands, then an empty final block
+        fh.write(_pngChunk(b"IDAT", b"\x78\x9c"))
+        adler = 1
+        for (data, band_adler, length) in _runJob(heatMap, orderRows, orderColumns,
+                                                  cellSize, compressLevel, workers,
+                                                  _bandTask, bands):
+            fh.write(_pngChunk(b"IDAT", data))
+            adler = _adlerCombine(adler, band_adler, length)
+        fh.write(_pngChunk(b"IDAT", b"\x03\x00" + struct.pack(">I", adler)))
+        fh.write(_pngChunk(b"IEND", b""))
+    written = [fileName]
+
+    if labels:
+        (row_ordering, column_ordering) = heatMap.orderings(orderRows, orderColumns)
+        base = os.path.splitext(fileName)[0]
+        for (axis, names, pixels) in [("rows", [heatMap.rowNames[r] for r in row_ordering], cell_height),
+                                      ("columns", [heatMap.columnNames[c] for c in column_ordering], cell_width)]:
+            if pixels >= minLabelPixels and len(names) * pixels < _MAX_PANEL_PIXELS:
+                panel = "%s.%s.png" % (base, axis)
+                drawLabelPanel(names, pixels, panel, axis=axis, fontPath=heatMap.fontPath)
+                written.append(panel)
+    return written
+
+def renderTileSet(heatMap,
+                  directory,
+                  tileSize=(256, 256),
+                  cellSize=(1, 1),
+                  orderRows=False,
+                  orderColumns=False,
+                  workers=None,
+                  compressLevel=6):
+    '''render a heatmap as a grid of png tiles, in parallel
+
+    Tiles go to <directory>/<tile row>/<tile column>.png and an index.json
+    describes the grid and holds the ordered row and column names so a
+    viewer can draw the labels itself
+
+    Inputs:
+     heatMap - HeatMap, the map to draw. Workers read data held in a
+               SharedArray or a memory mapped file in place, other data
+               is copied into shared memory once first
+     directory - string, where to put the tiles
+     tileSize - (int, int), cells per tile (across, down)
+     cellSize - (int, int), pixels per cell (width, height)
+     orderRows == True -> order rows by hierarchical clustering
+     orderColumns == True -> order columns by hierarchical clustering
+     workers - int, worker processes [all cores]
+     compressLevel - int, 0 - 9 zlib level
+
+    Outputs:
+     the index dict that was written to index.json
+    '''
+    (rows, cols) = np.shape(heatMap.data)
+    (tile_cols, tile_rows) = tileSize
+    tiles = []
+    for (ty, row_start) in enumerate(range(0, rows, tile_rows)):
+        tile_dir = os.path.join(directory, "%d" % ty)
+        os.makedirs(tile_dir, exist_ok=True)
+        for (tx, col_start) in enumerate(range(0, cols, tile_cols)):
+            tiles.append((ty, tx,
+                          row_start, min(row_start + tile_rows, rows),
+                          col_start, min(col_start + tile_cols, cols)))
+    for file_name in _runJob(heatMap, orderRows, orderColumns, cellSize, compressLevel,
+                             workers, _tileTask, tiles, extra={"directory" : directory}):
+        pass
+
+    (row_ordering, column_ordering) = heatMap.orderings(orderRows, orderColumns)
+    index = {"rows" : rows,
+             "columns" : cols,
+             "tileSize" : list(tileSize),
+             "cellSize" : list(cellSize),
+             "tilesDown" : (rows + tile_rows - 1) // tile_rows,
+             "tilesAcross" : (cols + tile_cols - 1) // tile_cols,
+             "rowNames" : [str(heatMap.rowNames[r]) for r in row_ordering],
+             "columnNames" : [str(heatMap.columnNames[c]) for c in column_ordering]}
+    with open(os.path.join(directory, "index.json"), "w") as fh:
+        json.dump(index, fh)
+    return index
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
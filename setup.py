@@ -7,7 +7,7 @@ setup(
     author='Michael Imelfort',
     author_email='mike@mikeimelfort.com',
     packages=['mikeplotlib'],
-    scripts=[],
+    scripts=['bin/mplBatchRender'],
     url='http://pypi.python.org/pypi/mikePlotLib/',
     license='GPLv3',
     description='mikePlotLib',
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+#    test_batchRender.py - checks for the batch renderer                      #
+#                                                                             #
+###############################################################################
+
+import json
+
+import pytest
+
+from mikeplotlib.batchRender import main, readManifest, renderJob
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+def test_manifest_job_without_output_is_rejected(tmp_path):
+    manifest = tmp_path / "jobs.json"
+    manifest.write_text(json.dumps([{"input" : "a.csv", "kind" : "heatmap"}]))
+    with pytest.raises(ValueError, match="has no output"):
+        main(["-m", str(manifest)])
+
+def test_short_tsv_manifest_line_is_rejected(tmp_path):
+    manifest = tmp_path / "jobs.tsv"
+    manifest.write_text("a.csv\theatmap\tout/a.png\nb.csv\tbars\n")
+    with pytest.raises(ValueError, match="line 2"):
+        readManifest(str(manifest))
+
+def test_failed_job_without_output_is_reported():
+    (output, status, message) = renderJob({"input" : "missing.csv", "kind" : "heatmap"})
+    assert output is None
+    assert status == "failed"
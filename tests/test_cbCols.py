@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+#    test_cbCols.py - checks for the colorbrewer helpers                      #
+#                                                                             #
+###############################################################################
+
+import numpy as np
+
+from mikeplotlib.cbCols import getDistinctColors
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+def _candidates(steps, lightness):
+    from mikeplotlib.cbCols import _distinctCandidates
+    return len(_distinctCandidates(steps, lightness)[0])
+
+def test_distinct_colors_beyond_the_candidate_pool():
+    # a coarse grid so the default pool runs out quickly
+    n = _candidates(4, (20., 90.)) + 40
+    colours = getDistinctColors(n, seed="qualSet1", steps=4)
+    assert len(colours) == n
+    assert len(np.unique(colours, axis=0)) == n
+
+def test_distinct_colors_extend_the_same_sequence():
+    small = getDistinctColors(20, seed=None, steps=4)
+    big = getDistinctColors(120, seed=None, steps=4)
+    assert np.array_equal(small, big[:20])
+    assert len(np.unique(big, axis=0)) == 120
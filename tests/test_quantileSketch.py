@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+#    test_quantileSketch.py - checks for the streaming quantile sketch        #
+#                                                                             #
+###############################################################################
+
+import numpy as np
+
+from mikeplotlib.heatMap import HeatMap
+from mikeplotlib.quantileSketch import QuantileSketch
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+def test_small_columns_match_numpy():
+    data = np.random.RandomState(0).rand(20, 3)
+    sketch = QuantileSketch(3)
+    sketch.update(data)
+    qs = [0., 0.01, 0.5, 0.99, 1.]
+    assert np.allclose(sketch.quantile(qs), np.percentile(data, np.array(qs) * 100., axis=0))
+
+def test_percentile_scaling_clips_small_outlier():
+    data = np.arange(20.).reshape(-1, 1)
+    data[7] = 1000.
+    HM = HeatMap(data, ["a"], [str(i) for i in range(20)], "rb", scaling="percentile")
+    assert HM.upperBounds[0] < 1000.
+    assert HM.lowerBounds[0] > 0.
+    assert np.allclose([HM.lowerBounds[0], HM.upperBounds[0]], np.percentile(data, [1., 99.]))
@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+#    test_sharedData.py - checks for arrays shared with worker processes      #
+#                                                                             #
+###############################################################################
+
+import numpy as np
+import pytest
+
+from mikeplotlib.sharedData import SharedArray
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+def test_asarray_copy_semantics():
+    with SharedArray.fromArray(np.arange(6, dtype=np.float64)) as shared:
+        assert np.shares_memory(np.asarray(shared), shared.array)
+        assert np.shares_memory(np.asarray(shared, copy=False), shared.array)
+        copied = np.array(shared, copy=True)
+        assert not np.shares_memory(copied, shared.array)
+        copied[0] = 10.
+        assert shared.array[0] == 0.
+        assert np.asarray(shared, dtype=np.float32).dtype == np.float32
+        with pytest.raises(ValueError):
+            np.asarray(shared, dtype=np.float32, copy=False)
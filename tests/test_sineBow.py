@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+###############################################################################
+#                                                                             #
+#    test_sineBow.py - checks for the sinebow color scales                    #
+#                                                                             #
+###############################################################################
+
+import numpy as np
+import pytest
+
+from mikeplotlib.sineBow import SineBow
+
+###############################################################################
+###############################################################################
+###############################################################################
+###############################################################################
+
+@pytest.mark.parametrize("mapType", SineBow.availableSchemes)
+@pytest.mark.parametrize("mode", ["bright", "soft"])
+def test_color_array_matches_make_color_out_of_range(mapType, mode):
+    SB = SineBow(10., lowerBound=2., mapType=mapType, mode=mode)
+    values = np.linspace(-20., 30., 501)
+    colors = SB.makeColorArray(values)
+    expected = np.array([SB.makeColor(float(v)) for v in values])
+    assert np.array_equal(colors, expected)
+    assert np.array_equal(colors[0], SB.makeColor(2.))
+    assert np.array_equal(colors[-1], SB.makeColor(10.))